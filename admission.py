@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import streamlit as st
+
+# Statements allowed to run at once against each database backend. A small
+# Postgres plan has its best throughput at a few concurrent queries; anything
+# beyond that only adds contention, so the rest wait here instead.
+BACKEND_LIMITS = {"primary": 6}
+# Statements a single session may have in flight at once
+PER_SESSION_LIMIT = 2
+# Longest a statement waits for a slot before giving up
+ADMISSION_TIMEOUT_SECONDS = 30
+# Recent queue waits kept for the metrics
+WAIT_SAMPLES = 1000
+
+
+class AdmissionTimeout(Exception):
+    pass
+
+
+# Bounded concurrency with per-session fair queuing. Waiting sessions are
+# served round-robin, so a session that fires many queries only gets one turn
+# per round and can't starve stage graders or other learners.
+class AdmissionController:
+    def __init__(self, limit, per_session_limit=PER_SESSION_LIMIT):
+        self.limit = limit
+        self.per_session_limit = per_session_limit
+        self.in_flight = 0
+        self.admitted = 0
+        self.timed_out = 0
+        self._session_in_flight = {}
+        self._queues = OrderedDict()  # session id -> waiting tickets, in turn order
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._cond = threading.Condition()
+
+    # Session whose turn it is, among those allowed another statement
+    def _next_session(self):
+        for session_id in self._queues:
+            if self._session_in_flight.get(session_id, 0) < self.per_session_limit:
+                return session_id
+        return None
+
+    def _can_run(self, session_id, ticket):
+        return (
+            self.in_flight < self.limit
+            and self._next_session() == session_id
+            and self._queues[session_id][0] is ticket
+        )
+
+    def _leave_queue(self, session_id, ticket):
+        queue = self._queues[session_id]
+        queue.remove(ticket)
+        if queue:
+            # Back of the line for this session's next statement
+            self._queues.move_to_end(session_id)
+        else:
+            del self._queues[session_id]
+
+    # Queue position of a session: waiting statements ahead of its next one
+    def _position(self, session_id):
+        ahead = 0
+        for other, queue in self._queues.items():
+            if other == session_id:
+                break
+            ahead += len(queue)
+        return ahead
+
+    # Hold a slot for the duration of the block. on_queued(position) is called
+    # once if the statement has to wait, outside the lock so that a slow or
+    # failing callback holds up nobody else.
+    @contextmanager
+    def admit(self, session_id, on_queued=None, timeout=ADMISSION_TIMEOUT_SECONDS):
+        ticket = object()
+        start = time.monotonic()
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            position = None if self._can_run(session_id, ticket) else self._position(session_id)
+        try:
+            if on_queued and position is not None:
+                on_queued(position)
+            with self._cond:
+                while not self._can_run(session_id, ticket):
+                    remaining = timeout - (time.monotonic() - start)
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        if not self._can_run(session_id, ticket):
+                            self.timed_out += 1
+                            raise AdmissionTimeout("The database is busy right now. Please try again in a moment.")
+                self._leave_queue(session_id, ticket)
+                self.in_flight += 1
+                self.admitted += 1
+                self._session_in_flight[session_id] = self._session_in_flight.get(session_id, 0) + 1
+                self._waits.append(time.monotonic() - start)
+        except BaseException:
+            # Timed out, or interrupted (a Streamlit rerun stops the script
+            # with an exception): give the turn to whoever is next
+            with self._cond:
+                if ticket in self._queues.get(session_id, ()):
+                    self._leave_queue(session_id, ticket)
+                    self._cond.notify_all()
+            raise
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._session_in_flight[session_id] -= 1
+                if not self._session_in_flight[session_id]:
+                    del self._session_in_flight[session_id]
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "waiting": sum(len(queue) for queue in self._queues.values()),
+                "admitted": self.admitted,
+                "timed_out": self.timed_out,
+                "avg_wait_ms": 1000 * sum(waits) / len(waits) if waits else 0.0,
+                "p95_wait_ms": 1000 * waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+            }
+
+
+# One controller per backend, shared by every session in the process
+@st.cache_resource
+def get_admission_controller(backend="primary"):
+    return AdmissionController(BACKEND_LIMITS[backend])
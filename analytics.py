@@ -0,0 +1,173 @@
+import atexit
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+import pandas as pd
+import streamlit as st
+from sql_utils import fingerprint_sql
+
+# Learning-analytics events (stage views, hints, graded attempts). Recording
+# an event only appends it to an in-memory buffer, so render_stage never
+# waits on the sink; a background thread writes the buffer out in batches,
+# when it holds enough events or every few seconds, as JSON lines. The
+# buffer is bounded: if the sink falls behind, the oldest unwritten events
+# are dropped and counted rather than letting memory grow. Each process
+# appends to its own file, so replicas never interleave partial lines.
+# Work on the recorded values, like fingerprinting submitted SQL, also
+# happens on the writer thread.
+
+DEFAULT_EVENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analytics")
+# Events held in memory at most
+MAX_BUFFERED_EVENTS = 50000
+# Events that trigger an early flush
+FLUSH_BATCH_EVENTS = 500
+# Seconds between flushes
+FLUSH_INTERVAL_SECONDS = 5
+# Submitted SQL kept per attempt event
+MAX_EVENT_SQL_CHARS = 2000
+
+
+class EventBuffer:
+    def __init__(self, directory, max_events=MAX_BUFFERED_EVENTS, batch_events=FLUSH_BATCH_EVENTS,
+                 flush_interval=FLUSH_INTERVAL_SECONDS):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"events-{socket.gethostname()}-{os.getpid()}.jsonl")
+        self.batch_events = batch_events
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._flush_forever, name="analytics-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    # Never blocks on I/O
+    def record(self, event_type, **fields):
+        event = {"type": event_type, "ts": time.time(), **fields}
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            self.recorded += 1
+            if len(self._events) >= self.batch_events:
+                self._lock.notify()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                batch = list(self._events)
+                self._events.clear()
+            if not batch:
+                return
+            for event in batch:
+                prepare_event(event)
+            with open(self.path, "a", encoding="utf-8") as sink:
+                sink.write("".join(json.dumps(event, default=str) + "\n" for event in batch))
+            with self._lock:
+                self.written += len(batch)
+
+    def _flush_forever(self):
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: len(self._events) >= self.batch_events, timeout=self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing analytics events: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "recorded": self.recorded,
+                "written": self.written,
+                "dropped": self.dropped,
+                "buffered": len(self._events),
+            }
+
+
+# Submitted SQL gets its canonical fingerprint (literals kept, so wrong values
+# are told apart) and is trimmed to an example
+def prepare_event(event):
+    if "sql" in event:
+        event["fingerprint"] = fingerprint_sql(event["sql"])
+        event["sql"] = event["sql"][:MAX_EVENT_SQL_CHARS]
+
+
+def events_dir():
+    return st.secrets.get("analytics", {}).get("EVENTS_DIR", DEFAULT_EVENTS_DIR)
+
+# One buffer per server process
+@st.cache_resource
+def get_event_buffer():
+    return EventBuffer(events_dir())
+
+def record_event(event_type, **fields):
+    get_event_buffer().record(event_type, **fields)
+
+
+# Every process's events. Cached on the files' sizes, so the report only
+# re-reads them once something new has been written.
+@st.cache_data(show_spinner=False, max_entries=2)
+def _read_events(files):
+    frames = [pd.read_json(path, lines=True) for path, _ in files]
+    frames = [frame for frame in frames if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def load_events(directory=None):
+    paths = sorted(glob.glob(os.path.join(directory or events_dir(), "events-*.jsonl")))
+    return _read_events(tuple((path, os.path.getsize(path)) for path in paths))
+
+
+# Per-stage funnel: learners who viewed, attempted and solved each stage,
+# attempts before success, time from first view to solve, and hint usage
+def stage_funnel(events):
+    if events.empty:
+        return pd.DataFrame()
+    keys = ["level", "stage"]
+    views = events[events["type"] == "stage_view"]
+    attempts = events[events["type"] == "attempt"]
+    solves = attempts[attempts["correct"] == True]  # noqa: E712 (NaN-safe)
+    hints = events[events["type"] == "hint"]
+
+    report = views.groupby(keys)["learner"].nunique().rename("viewed").to_frame()
+    report = report.join(attempts.groupby(keys)["learner"].nunique().rename("attempted"), how="outer")
+    report = report.join(solves.groupby(keys)["learner"].nunique().rename("solved"), how="outer")
+
+    # Attempts up to and including each learner's first success
+    first_solve = solves.groupby(keys + ["learner"])["ts"].min().rename("solved_at")
+    attempts = attempts.join(first_solve, on=keys + ["learner"])
+    before = attempts[attempts["ts"] <= attempts["solved_at"]].groupby(keys + ["learner"]).size()
+    report = report.join(before.groupby(keys).median().rename("median_attempts_to_solve"), how="outer")
+
+    first_view = views.groupby(keys + ["learner"])["ts"].min().rename("viewed_at")
+    solve_times = first_solve.to_frame().join(first_view, how="inner")
+    solve_times = (solve_times["solved_at"] - solve_times["viewed_at"]).groupby(keys).median()
+    report = report.join(solve_times.rename("median_seconds_to_solve"), how="outer")
+
+    hinted = hints.groupby(keys)["learner"].nunique().rename("used_hints")
+    report = report.join(hinted, how="outer")
+    counts = ["viewed", "attempted", "solved", "used_hints"]
+    report[counts] = report[counts].fillna(0).astype(int)
+    report["hint_rate"] = report["used_hints"] / report["viewed"].where(report["viewed"] > 0)
+    return report.reset_index().sort_values(keys)
+
+# Most common wrong answers per stage, by canonical fingerprint, with an example
+def common_wrong_answers(events, limit=10):
+    if events.empty or "fingerprint" not in events:
+        return pd.DataFrame()
+    wrong = events[(events["type"] == "attempt") & (events["correct"] == False)]  # noqa: E712
+    if wrong.empty:
+        return pd.DataFrame()
+    report = wrong.groupby(["level", "stage", "fingerprint"]).agg(
+        submissions=("ts", "size"),
+        learners=("learner", "nunique"),
+        example=("sql", "last"),
+    )
+    return report.reset_index().sort_values("submissions", ascending=False).head(limit)
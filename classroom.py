@@ -0,0 +1,183 @@
+import secrets
+import string
+import time
+import streamlit as st
+from state_backend import WriteBehindStore, get_state_backend
+from progress_store import learner_id
+
+# Classroom mode for workshops. An instructor opens a room, learners join it
+# with its code, and the room keeps per-stage counters (attempts, learners
+# who solved) that graded attempts update incrementally: attempts are queued
+# write-behind as deltas, summed while they wait, and each flush stamps the
+# rows it changes with the room's next sequence number. The dashboard keeps
+# the counters it has seen and only fetches rows stamped after them, so a
+# refresh reads what changed rather than the room's tables. Rooms live in
+# the shared state backend, so every app process sees them.
+
+# Characters in a room code
+ROOM_CODE_LENGTH = 6
+ROOM_CODE_ALPHABET = string.ascii_uppercase + string.digits
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS classroom_rooms (
+        code TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        opened_at {real} NOT NULL,
+        closed_at {real},
+        members INTEGER NOT NULL,
+        seq INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS classroom_members (
+        room TEXT NOT NULL,
+        learner TEXT NOT NULL,
+        name TEXT NOT NULL,
+        joined_at {real} NOT NULL,
+        PRIMARY KEY (room, learner)
+    )
+    """,
+    # Who solved what, so a stage counts each learner once
+    """
+    CREATE TABLE IF NOT EXISTS classroom_solves (
+        room TEXT NOT NULL,
+        learner TEXT NOT NULL,
+        level TEXT NOT NULL,
+        stage INTEGER NOT NULL,
+        PRIMARY KEY (room, learner, level, stage)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS classroom_stages (
+        room TEXT NOT NULL,
+        level TEXT NOT NULL,
+        stage INTEGER NOT NULL,
+        attempts INTEGER NOT NULL,
+        solved INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (room, level, stage)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS classroom_stages_seq ON classroom_stages (room, seq)",
+]
+
+NEXT_SEQ_SQL = "UPDATE classroom_rooms SET seq = seq + 1 WHERE code = ?"
+
+STAGE_UPSERT_SQL = """
+INSERT INTO classroom_stages (room, level, stage, attempts, solved, seq)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (room, level, stage) DO UPDATE SET
+    attempts = classroom_stages.attempts + excluded.attempts,
+    solved = classroom_stages.solved + excluded.solved,
+    seq = excluded.seq
+"""
+
+
+class Classroom(WriteBehindStore):
+    SCHEMA = SCHEMA
+
+    def open_room(self, name):
+        def create(cur, sql):
+            while True:
+                code = "".join(secrets.choice(ROOM_CODE_ALPHABET) for _ in range(ROOM_CODE_LENGTH))
+                cur.execute(sql(
+                    "INSERT INTO classroom_rooms (code, name, opened_at, closed_at, members, seq) "
+                    "VALUES (?, ?, ?, NULL, 0, 0) ON CONFLICT (code) DO NOTHING"
+                ), (code, name, time.time()))
+                if cur.rowcount == 1:
+                    return code
+        return self._transaction(create)
+
+    def close_room(self, code):
+        self._transaction(lambda cur, sql: cur.execute(
+            sql("UPDATE classroom_rooms SET closed_at = ? WHERE code = ? AND closed_at IS NULL"), (time.time(), code)
+        ))
+
+    def open_rooms(self):
+        rows = self._read("SELECT code, name FROM classroom_rooms WHERE closed_at IS NULL ORDER BY opened_at DESC")
+        return [{"code": code, "name": name} for code, name in rows]
+
+    # Add a learner to an open room; False if it's unknown or closed
+    def join(self, code, learner, name):
+        def join(cur, sql):
+            cur.execute(sql("SELECT closed_at FROM classroom_rooms WHERE code = ?"), (code,))
+            row = cur.fetchone()
+            if row is None or row[0] is not None:
+                return False
+            cur.execute(sql(
+                "INSERT INTO classroom_members (room, learner, name, joined_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (room, learner) DO NOTHING"
+            ), (code, learner, name, time.time()))
+            if cur.rowcount == 1:
+                cur.execute(sql("UPDATE classroom_rooms SET members = members + 1, seq = seq + 1 WHERE code = ?"), (code,))
+            return True
+        return self._transaction(join)
+
+    # Queue a graded attempt; returns at once
+    def record_attempt(self, code, learner, level, stage, correct):
+        self._queue((code, level, stage), {"attempts": 1, "solvers": {learner} if correct else set()})
+
+    def _merge(self, pending, value):
+        return {"attempts": pending["attempts"] + value["attempts"], "solvers": pending["solvers"] | value["solvers"]}
+
+    def _write(self, cur, sql, batch):
+        seqs = {}
+        for code in {code for code, _, _ in batch}:
+            cur.execute(sql(NEXT_SEQ_SQL), (code,))
+            cur.execute(sql("SELECT seq FROM classroom_rooms WHERE code = ?"), (code,))
+            seqs[code] = cur.fetchone()[0]
+        rows = []
+        for (code, level, stage), delta in batch.items():
+            # Only learners solving the stage for the first time in this room count
+            solved = 0
+            for learner in delta["solvers"]:
+                cur.execute(sql(
+                    "INSERT INTO classroom_solves (room, learner, level, stage) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (room, learner, level, stage) DO NOTHING"
+                ), (code, learner, level, stage))
+                solved += cur.rowcount
+            rows.append((code, level, stage, delta["attempts"], solved, seqs[code]))
+        cur.executemany(sql(STAGE_UPSERT_SQL), rows)
+
+    # The room and its stage counters changed after sequence number since:
+    # (room row, [(level, stage, attempts, solved)], latest seq)
+    def changes(self, code, since=0):
+        def read(cur, sql):
+            cur.execute(sql("SELECT name, members, closed_at, seq FROM classroom_rooms WHERE code = ?"), (code,))
+            name, members, closed_at, seq = cur.fetchone()
+            cur.execute(sql(
+                "SELECT level, stage, attempts, solved FROM classroom_stages WHERE room = ? AND seq > ?"
+            ), (code, since))
+            room = {"code": code, "name": name, "members": members, "open": closed_at is None}
+            return room, cur.fetchall(), seq
+        return self._transaction(read)
+
+
+# One classroom store per server process, in the shared state backend
+@st.cache_resource
+def get_classroom():
+    return Classroom(get_state_backend())
+
+
+# Sidebar box for learners to join a room. The room code stays in session
+# state, so the level pages can count their graded attempts in it.
+def render_classroom_join():
+    st.sidebar.markdown("### 🏫 Classroom")
+    # Seeded from session state: widget values don't follow the learner across pages
+    joined = st.session_state.classroom[0] if st.session_state.classroom else ""
+    code = st.sidebar.text_input("Room code", value=joined).strip().upper()
+    if not code:
+        st.session_state.classroom = None
+        return
+    learner = learner_id(st.session_state.user_name)
+    if learner is None:
+        st.sidebar.caption("Enter your astronaut's name to join.")
+        return
+    if st.session_state.get("classroom") != (code, learner):
+        if not get_classroom().join(code, learner, st.session_state.user_name.strip()):
+            st.session_state.classroom = None
+            st.sidebar.error(f"There's no open room {code}.")
+            return
+        st.session_state.classroom = (code, learner)
+    st.sidebar.caption(f"You're in room {code}.")
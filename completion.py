@@ -0,0 +1,155 @@
+import re
+import streamlit as st
+from schema_catalog import load_catalog, catalog_key
+
+# Schema-aware completion for the SQL editors. A prefix trie over table and
+# column names, keywords and common functions is built once per catalog
+# version and kept in memory, so each lookup is a walk down a few dict levels
+# rather than a database round trip. After "alias." only that table's
+# columns are offered. streamlit-ace has no hook for custom completers, so
+# suggestions are shown below the editor as the learner types.
+
+# Suggestions shown at once
+MAX_SUGGESTIONS = 8
+
+SQL_KEYWORDS = [
+    "SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT", "OFFSET", "DISTINCT",
+    "JOIN", "INNER JOIN", "LEFT JOIN", "RIGHT JOIN", "FULL JOIN", "CROSS JOIN", "ON", "USING",
+    "AND", "OR", "NOT", "IN", "EXISTS", "BETWEEN", "LIKE", "ILIKE", "IS NULL", "IS NOT NULL",
+    "AS", "ASC", "DESC", "NULLS FIRST", "NULLS LAST", "CASE", "WHEN", "THEN", "ELSE", "END",
+    "WITH", "UNION", "UNION ALL", "INTERSECT", "EXCEPT", "INSERT INTO", "VALUES", "UPDATE", "SET",
+    "DELETE FROM", "CREATE TABLE", "CREATE INDEX", "DROP TABLE", "TRUNCATE", "OVER", "PARTITION BY",
+]
+
+SQL_FUNCTIONS = [
+    "COUNT", "SUM", "AVG", "MIN", "MAX", "ROUND", "ABS", "COALESCE", "NULLIF", "LENGTH", "LOWER",
+    "UPPER", "TRIM", "SUBSTRING", "CONCAT", "EXTRACT", "DATE_TRUNC", "DATE_PART", "NOW", "AGE",
+    "CAST", "STRING_AGG", "ARRAY_AGG", "ROW_NUMBER", "RANK", "DENSE_RANK", "LAG", "LEAD",
+]
+
+# Keywords after which a table name comes next
+TABLE_CONTEXT = re.compile(r"\b(from|join|into|update|table)\s+$", re.IGNORECASE)
+# The word being typed, optionally after "qualifier."
+CURRENT_WORD = re.compile(r"(?:([A-Za-z_]\w*)\.)?(\w*)$")
+
+# "FROM table alias" / "JOIN table AS alias". A regex rather than a parse:
+# text being typed is rarely valid SQL, and it keeps lookups in microseconds.
+TABLE_ALIAS = re.compile(r"\b(?:from|join)\s+(?:\w+\.)?(\w+)(?:\s+(?:as\s+)?(\w+))?", re.IGNORECASE)
+# Words that can follow a table name without being its alias
+NOT_ALIASES = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using", "group",
+    "order", "limit", "offset", "having", "union", "intersect", "except", "window", "for", "set",
+}
+
+# Kinds in the order they're offered when several match
+KIND_ORDER = {"column": 0, "table": 1, "function": 2, "keyword": 3}
+
+
+# Prefix trie: each node is a dict of child characters, plus the entries for
+# words ending there under the None key
+class CompletionTrie:
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def insert(self, word, entry):
+        node = self.root
+        for char in word.lower():
+            node = node.setdefault(char, {})
+        if entry not in node.setdefault(None, []):
+            node[None].append(entry)
+            self.size += 1
+
+    # Entries for words starting with prefix, shortest words first
+    def complete(self, prefix, limit=None, accept=None):
+        node = self.root
+        for char in prefix.lower():
+            node = node.get(char)
+            if node is None:
+                return []
+        results, level = [], [node]
+        while level and (limit is None or len(results) < limit):
+            next_level = []
+            for current in level:
+                for entry in current.get(None, []):
+                    if accept is None or accept(entry):
+                        results.append(entry)
+                next_level.extend(child for char, child in sorted(current.items(), key=_child_order) if char)
+            level = next_level
+        return results[:limit] if limit is not None else results
+
+def _child_order(item):
+    return item[0] or ""
+
+
+# Trie over everything in a catalog, plus SQL keywords and functions
+def build_completion_index(catalog):
+    trie = CompletionTrie()
+    columns = {}
+    for table, info in catalog["tables"].items():
+        trie.insert(table, {"text": table, "kind": "table", "detail": info["kind"]})
+        columns[table] = [column["name"] for column in info["columns"]]
+        for column in info["columns"]:
+            trie.insert(column["name"], {"text": column["name"], "kind": "column", "detail": column["type"]})
+    for keyword in SQL_KEYWORDS:
+        trie.insert(keyword, {"text": keyword, "kind": "keyword", "detail": ""})
+    for function in SQL_FUNCTIONS:
+        trie.insert(function, {"text": f"{function}()", "kind": "function", "detail": ""})
+    return {"trie": trie, "columns": columns}
+
+# One index per catalog version, shared by every session
+@st.cache_resource(max_entries=64, show_spinner=False)
+def _load_completion_index(schema, version):
+    return build_completion_index(load_catalog(schema, version))
+
+def get_completion_index(schema=None):
+    return _load_completion_index(*catalog_key(schema))
+
+
+# Suggestions for the word at the end of text
+def suggest(text, index, limit=MAX_SUGGESTIONS):
+    # Only the end of the text matters for the word being typed
+    tail = (text or "")[-128:]
+    match = CURRENT_WORD.search(tail)
+    qualifier, prefix = match.group(1), match.group(2)
+    before = tail[:match.start()]
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(text or ""):
+        table = table.lower()
+        if table in index["columns"]:
+            aliases[table] = table
+            if alias and alias.lower() not in NOT_ALIASES:
+                aliases[alias.lower()] = table
+
+    if qualifier:
+        # "m." completes to the columns of the table aliased m
+        table = aliases.get(qualifier.lower())
+        if table is None and qualifier.lower() in index["columns"]:
+            table = qualifier.lower()
+        if table is None:
+            return []
+        return [
+            {"text": column, "kind": "column", "detail": table}
+            for column in index["columns"][table] if column.startswith(prefix.lower())
+        ][:limit]
+    if not prefix:
+        return []
+
+    if TABLE_CONTEXT.search(before):
+        return index["trie"].complete(prefix, limit, accept=lambda entry: entry["kind"] == "table")
+
+    # Columns of tables already in the query come first
+    in_query = {column for table in aliases.values() for column in index["columns"][table]}
+    candidates = index["trie"].complete(prefix, limit * 4)
+    candidates.sort(key=lambda entry: (entry["text"] not in in_query, KIND_ORDER[entry["kind"]]))
+    return [entry for entry in candidates if entry["text"].lower() != prefix.lower()][:limit]
+
+# Suggestions line below an editor. A catalog that can't be loaded simply
+# means no suggestions.
+def render_suggestions(text, schema=None):
+    try:
+        suggestions = suggest(text, get_completion_index(schema))
+    except Exception:
+        return
+    if suggestions:
+        st.caption("💡 " + " · ".join(f"`{entry['text']}` {entry['kind']}" for entry in suggestions))
@@ -0,0 +1,76 @@
+-- Synthetic, million-row variant of the galaxy schema used by the Quasar level.
+-- Same tables and columns as init.sql, generated in their own schema so the
+-- small teaching tables stay untouched:
+--   psql "$DB_URL" -f db/scaled.sql
+
+CREATE SCHEMA IF NOT EXISTS galaxy_scaled;
+SET search_path TO galaxy_scaled;
+
+DROP TABLE IF EXISTS moons, missions, planets;
+
+-- Fixed seed so every deployment generates the same galaxy
+SELECT setseed(0.42);
+
+-- Step 1: 1,000 planets
+CREATE TABLE planets (
+    planet_id SERIAL PRIMARY KEY,
+    planet_name VARCHAR(50) NOT NULL,
+    distance_from_earth INT CHECK (distance_from_earth >= 0),
+    discoverer VARCHAR (100),
+    discovery_year INT CHECK (discovery_year >= -500)
+);
+
+INSERT INTO planets (planet_name, distance_from_earth, discoverer, discovery_year)
+SELECT
+    'Planet ' || i,
+    floor(random() * 10000)::INT,
+    (ARRAY['Galileo', 'Huygens', 'William Herschel', 'Le Verrier', 'Tombaugh', 'Kepler'])[1 + floor(random() * 6)::INT],
+    CASE WHEN random() < 0.1 THEN NULL ELSE 1600 + floor(random() * 425)::INT END
+FROM generate_series(1, 1000) AS i;
+
+CREATE INDEX idx_planets_discovery_year ON planets (discovery_year);
+
+-- Step 2: 1,000,000 missions, skewed towards the first planets, 1960-2023
+CREATE TABLE missions (
+    mission_id SERIAL PRIMARY KEY,
+    planet_id INT REFERENCES planets(planet_id),
+    mission_name VARCHAR (100) NOT NULL,
+    mission_date DATE,
+    crew_size INT
+);
+
+INSERT INTO missions (planet_id, mission_name, mission_date, crew_size)
+SELECT
+    1 + floor(power(random(), 2) * 1000)::INT,
+    'Mission ' || i,
+    DATE '1960-01-01' + floor(random() * 23376)::INT,
+    floor(random() * 9)::INT
+FROM generate_series(1, 1000000) AS i;
+
+CREATE INDEX idx_missions_planet_id ON missions (planet_id);
+CREATE INDEX idx_missions_mission_date ON missions (mission_date);
+
+-- Step 3: 100,000 moons
+CREATE TABLE moons (
+    moon_id SERIAL PRIMARY KEY,
+    moon_name VARCHAR(100) NOT NULL,
+    planet_id INT REFERENCES planets(planet_id),
+    diameter_km DECIMAL(10, 2),
+    discovered_by VARCHAR(100),
+    discovery_year INT
+);
+
+INSERT INTO moons (moon_name, planet_id, diameter_km, discovered_by, discovery_year)
+SELECT
+    'Moon ' || i,
+    1 + floor(random() * 1000)::INT,
+    round((random() * 5500)::NUMERIC, 2),
+    (ARRAY['Galileo', 'Asaph Hall', 'William Lassell', 'James Christy', 'Christiaan Huygens'])[1 + floor(random() * 5)::INT],
+    1600 + floor(random() * 425)::INT
+FROM generate_series(1, 100000) AS i;
+
+CREATE INDEX idx_moons_planet_id ON moons (planet_id);
+
+ANALYZE planets;
+ANALYZE missions;
+ANALYZE moons;
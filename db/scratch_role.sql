@@ -0,0 +1,16 @@
+-- Role that learners' scratch statements run as (see scratch.py). It owns the
+-- per-session scratch schemas and the tables in them, and gets no privileges
+-- on the shared galaxy tables (public, galaxy_scaled) or the app's state
+-- (app_state), so the database itself refuses writes that escape scratch.
+-- Run once as a superuser, with the app's database user in place of galaxy_app.
+-- A different role name goes in the [postgresql] SCRATCH_ROLE secret.
+
+CREATE ROLE galaxy_scratch NOLOGIN;
+
+-- The app's user switches to the role with SET ROLE and creates schemas for it
+GRANT galaxy_scratch TO galaxy_app;
+
+-- Nothing reaches the shared schemas through PUBLIC
+REVOKE CREATE ON SCHEMA public FROM PUBLIC;
+REVOKE ALL ON ALL TABLES IN SCHEMA public FROM PUBLIC;
+REVOKE ALL ON ALL TABLES IN SCHEMA galaxy_scaled FROM PUBLIC;
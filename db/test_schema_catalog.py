@@ -0,0 +1,51 @@
+# The pre-submit checks of schema_catalog.validate_query, against a catalog
+# of the galaxy tables built by hand: real mistakes are reported, valid
+# queries (CTEs, subqueries, functions with FROM) pass. Usage:
+#   python -m pytest db/test_schema_catalog.py
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from schema_catalog import validate_query
+
+
+def table(*columns):
+    return {
+        "kind": "table", "rows": None, "primary_key": [columns[0]], "foreign_keys": {}, "indexes": [],
+        "columns": [{"name": name, "type": "text", "nullable": True} for name in columns],
+    }
+
+CATALOG = {
+    "schema": "public",
+    "tables": {
+        "planets": table("planet_id", "planet_name", "distance_from_earth", "discoverer", "discovery_year"),
+        "moons": table("moon_id", "moon_name", "planet_id", "diameter_km", "discovered_by", "discovery_year"),
+        "missions": table("mission_id", "planet_id", "mission_name", "mission_date", "crew_size"),
+    },
+}
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM planets",
+    "SELECT p.planet_name, m.moon_name FROM planets p JOIN moons m ON m.planet_id = p.planet_id",
+    "SELECT * FROM (SELECT planet_id FROM planets) AS sub",
+    "SELECT EXTRACT(YEAR FROM mission_date) FROM missions",
+    "WITH big AS (SELECT * FROM moons WHERE diameter_km > 1000) SELECT * FROM big",
+    "WITH a AS (SELECT 1), b AS (SELECT 2) SELECT * FROM a, b",
+    "WITH r(n) AS (SELECT 1) SELECT * FROM r",
+    "WITH RECURSIVE r(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r WHERE n < 5) SELECT * FROM r",
+    "WITH RECURSIVE r AS (SELECT 1 AS n UNION ALL SELECT n + 1 FROM r WHERE n < 5) SELECT * FROM r",
+    "SELECT * FROM galaxy_scaled.planets",
+])
+def test_valid_queries(query):
+    assert validate_query(query, CATALOG) == []
+
+
+@pytest.mark.parametrize("query, problem", [
+    ("SELECT * FROM planet", "There is no table named `planet`. Did you mean `planets`?"),
+    ("SELECT p.planet_nam FROM planets p", "`planets` has no column named `planet_nam`. Did you mean `planet_name`?"),
+    ("WITH RECURSIVE r(n) AS (SELECT 1) SELECT * FROM r JOIN moon ON true", "There is no table named `moon`. Did you mean `moons`?"),
+])
+def test_reported_problems(query, problem):
+    assert validate_query(query, CATALOG) == [problem]
@@ -1,44 +1,274 @@
 import streamlit as st
 import psycopg2
 import pandas as pd
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from psycopg2 import pool
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from urllib.parse import urlparse
+from sql_utils import is_read_only_query
+from result_cache import get_result_cache, result_cache_key
+from admission import get_admission_controller, BACKEND_LIMITS
+from query_workers import WorkerPool, QueryHandle, QueryCancelled
+from materialize import frame_from_cursor, register_fast_types
+
+# Tables every learner works with, and their primary keys
+GALAXY_TABLES = {"planets": "planet_id", "missions": "mission_id", "moons": "moon_id"}
+
+# Connections kept open per pool (admission control never lets more than this
+# many statements run at once), and the hard limit for any pooled statement
+POOL_SIZE = BACKEND_LIMITS["primary"]
+USER_STATEMENT_TIMEOUT_MS = 10000
+# How often a waiting page refreshes a running query's progress
+PROGRESS_INTERVAL_SECONDS = 0.25
+
+# Connection parameters from the DB_URL in Streamlit secrets
+def connection_params():
+    # Get the DB_URL from Streamlit secrets
+    database_url = st.secrets["postgresql"]["DB_URL"]
+    
+    # Parse the DATABASE_URL
+    url = urlparse(database_url)
+    
+    # Extract components from the URL
+    return dict(
+        host=url.hostname,
+        database=url.path[1:],  # Remove the leading '/'
+        user=url.username,
+        password=url.password,
+        port=url.port
+    )
 
 # PostgreSQL Database connection using Streamlit secrets
 def create_connection():
     try:
-        # Get the DATABASE_URL from Streamlit secrets
-        database_url = st.secrets["postgresql"]["DATABASE_URL"]
-        
-        # Parse the DATABASE_URL
-        url = urlparse(database_url)
-        
-        # Extract components from the URL
-        conn = psycopg2.connect(
-            host=url.hostname,
-            database=url.path[1:],  # Remove the leading '/'
-            user=url.username,
-            password=url.password,
-            port=url.port
-        )
+        conn = psycopg2.connect(**connection_params())
         return conn
     except Exception as e:
         st.error(f"Error connecting to the database: {e}")
         return None
 
-# Function to execute SQL query and return result as DataFrame
-def execute_sql_query(query):
-    conn = create_connection()
-    if conn:
+# One pool of read-only connections and one of read-write connections for
+# scratch work, shared by every session in the process
+@st.cache_resource
+def get_connection_pool(mode):
+    return pool.ThreadedConnectionPool(
+        1, POOL_SIZE,
+        options=f"-c statement_timeout={USER_STATEMENT_TIMEOUT_MS}",
+        **connection_params()
+    )
+
+# Worker processes that run user SQL outside the Streamlit process, one per
+# admission slot so an admitted statement never waits for a worker. Their
+# connections get the pools' statement timeout too, so a statement the
+# worker gives up on doesn't keep running on the server.
+@st.cache_resource
+def get_worker_pool():
+    return WorkerPool(
+        POOL_SIZE, dict(connection_params(), options=f"-c statement_timeout={USER_STATEMENT_TIMEOUT_MS}")
+    )
+
+# Threads that wait on the workers for background queries, so a session's
+# script thread is free while the database works. Threads beyond the
+# admission limit simply wait in the admission queue.
+@st.cache_resource
+def get_query_executor():
+    return ThreadPoolExecutor(max_workers=POOL_SIZE * 4, thread_name_prefix="query")
+
+# Wait for a slot from the admission controller before touching the database.
+# While a statement is queued, the page shows a status that clears once it runs.
+@contextmanager
+def admitted(backend="primary"):
+    placeholders = []
+    def on_queued(position):
+        if get_script_run_ctx():
+            placeholder = st.empty()
+            placeholder.info(f"🛰️ Queued for launch: {position} {'query' if position == 1 else 'queries'} ahead of yours...")
+            placeholders.append(placeholder)
+    with get_admission_controller(backend).admit(get_session_id(), on_queued=on_queued):
+        for placeholder in placeholders:
+            placeholder.empty()
+        yield
+
+# Borrow a pooled connection. Read connections run in read-only autocommit
+# mode, so the read path skips BEGIN/COMMIT round trips entirely; write
+# connections are always rolled back before they go back to the pool.
+@contextmanager
+def pooled_connection(mode="read"):
+    with admitted():
+        connection_pool = get_connection_pool(mode)
+        conn = connection_pool.getconn()
         try:
-            cur = conn.cursor()
-            cur.execute(query)
-            columns = [desc[0] for desc in cur.description]  # Get column names
-            result = cur.fetchall()  # Fetch all rows
-            cur.close()
-            conn.close()
-            return pd.DataFrame(result, columns=columns)  # Return result as DataFrame
+            if mode == "read" and not conn.autocommit:
+                conn.set_session(readonly=True, autocommit=True)
+            yield conn
+        finally:
+            if not conn.closed and not conn.autocommit:
+                conn.rollback()
+            connection_pool.putconn(conn, close=bool(conn.closed))
+
+# Identifies the Streamlit session running the current script
+def get_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+# Start a read in the background and return its QueryHandle right away.
+# on_result(frame) is called with the rows once the query succeeds.
+def submit_read_query(query, on_result=None):
+    handle = QueryHandle(query)
+    # Resolved on the script thread: the background thread has no session
+    session_id = get_session_id()
+    controller = get_admission_controller()
+    worker_pool = get_worker_pool()
+
+    def run():
+        try:
+            with controller.admit(session_id, on_queued=handle.set_queued):
+                if handle.cancel_requested:
+                    raise QueryCancelled("Query cancelled.")
+                result, _, _, _ = worker_pool.run_query(
+                    query,
+                    default_timeout_ms=USER_STATEMENT_TIMEOUT_MS,
+                    handle=handle,
+                    bulk=is_read_only_query(query)
+                )
+            result = result if result is not None else pd.DataFrame()
+            if on_result:
+                on_result(result)
+            handle.finish(result=result)
+        except QueryCancelled as e:
+            handle.finish(error=str(e), status="cancelled")
         except Exception as e:
-            print(f"Error executing query: {e}")
-            return pd.DataFrame()  # Return empty DataFrame if error
-    else:
+            handle.finish(error=str(e))
+
+    get_query_executor().submit(run)
+    return handle
+
+# Block until a background query is done, showing its progress meanwhile
+def wait_for_query(handle):
+    status = st.empty() if get_script_run_ctx() else None
+    while not handle.wait(PROGRESS_INTERVAL_SECONDS):
+        if status:
+            status.caption(f"⏳ {handle.describe_progress()}")
+    if status:
+        status.empty()
+    return handle
+
+# Read path: a worker process on a read-only autocommit connection, no
+# explicit transaction. A runaway query costs the worker, not the app.
+def execute_read_query(query):
+    handle = wait_for_query(submit_read_query(query))
+    if handle.error:
+        st.error(f"Error executing query: {handle.error}")
         return pd.DataFrame()
+    return handle.result
+
+class ScriptError(Exception):
+    def __init__(self, index, error, results):
+        super().__init__(f"Statement {index + 1}: {error}")
+        self.index = index
+        self.results = results
+
+
+# Run a script's statements one after another on a cursor, recording each
+# one's rows (a DataFrame, or None for statements without a result set),
+# row count, status and timing. Raises ScriptError naming the failed statement.
+def run_statements(cur, statements):
+    register_fast_types(cur)
+    results = []
+    for index, statement in enumerate(statements):
+        start = time.perf_counter()
+        try:
+            cur.execute(statement)
+            frame = frame_from_cursor(cur) if cur.description else None
+        except Exception as e:
+            raise ScriptError(index, e, results) from e
+        results.append({
+            "statement": statement,
+            "result": frame,
+            "rowcount": cur.rowcount,
+            "status": cur.statusmessage,
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        })
+    return results
+
+# Run a read-only script in one transaction over one pooled connection
+def execute_read_script(statements, search_path=None):
+    with pooled_connection("write") as conn:
+        cur = conn.cursor()
+        # SET LOCAL keeps these settings inside the (rolled back) transaction
+        cur.execute("SET TRANSACTION READ ONLY")
+        if search_path:
+            cur.execute("SET LOCAL search_path TO %s", (search_path,))
+        results = run_statements(cur, statements)
+        cur.close()
+        return results
+
+# Copy the galaxy tables into a schema, with private id sequences so inserts
+# never advance the shared ones. Scratch copies are unlogged: they are cheap to
+# write and don't need to survive a crash.
+def clone_galaxy_tables(cur, schema, unlogged=True):
+    for table, key in GALAXY_TABLES.items():
+        cur.execute(f"CREATE {'UNLOGGED ' if unlogged else ''}TABLE {schema}.{table} (LIKE public.{table} INCLUDING ALL)")
+        cur.execute(f"INSERT INTO {schema}.{table} SELECT * FROM public.{table}")
+        cur.execute(f"CREATE SEQUENCE {schema}.{table}_{key}_seq OWNED BY {schema}.{table}.{key}")
+        cur.execute(f"SELECT setval('{schema}.{table}_{key}_seq', COALESCE(MAX({key}), 0) + 1, false) FROM {schema}.{table}")
+        cur.execute(f"ALTER TABLE {schema}.{table} ALTER COLUMN {key} SET DEFAULT nextval('{schema}.{table}_{key}_seq')")
+
+# Serve read-only queries from the shared result cache, so identical queries
+# from any session only reach the database once per dataset version.
+# search_path is part of the key; execute runs the query on a cache miss.
+def execute_cached_query(query, search_path=None, execute=None):
+    if not is_read_only_query(query):
+        # The read-only connection refuses anything that would write
+        return execute_read_query(query)
+    cache = get_result_cache()
+    key = result_cache_key(query, search_path)
+    result = cache.get(key)
+    if result is None:
+        result = (execute or execute_read_query)(query)
+        # Errors come back as empty frames, so only real results are cached
+        if result is not None and not result.empty:
+            cache.put(key, result)
+    return result
+
+# Planner's estimate of the rows a query returns, without running it
+def estimate_row_count(query, search_path=None):
+    with admitted():
+        _, _, plan, _ = get_worker_pool().run_query(
+            query,
+            search_path=search_path,
+            explain=True,
+            execute=False,
+            default_timeout_ms=USER_STATEMENT_TIMEOUT_MS
+        )
+    return int(plan["Plan Rows"])
+
+# Summarize a JSON plan as "Limit → Index Scan on missions → ..."
+def describe_plan(plan):
+    steps, nodes = [], [plan]
+    while nodes:
+        node = nodes.pop(0)
+        step = node["Node Type"]
+        if "Relation Name" in node:
+            step += f" on {node['Relation Name']}"
+        steps.append(step)
+        nodes = node.get("Plans", []) + nodes
+    return " → ".join(steps)
+
+# Run a read-only query under a hard statement timeout, optionally against
+# another schema, and report wall-clock time and plan shape alongside the rows.
+# The worker kills the query if the database doesn't stop it in time.
+# Errors (including QueryTimeout) are raised to the caller.
+def profile_sql_query(query, search_path=None, timeout_ms=None):
+    with admitted():
+        result, elapsed_ms, plan, _ = get_worker_pool().run_query(
+            query,
+            search_path=search_path,
+            timeout_ms=timeout_ms,
+            explain=True,
+            default_timeout_ms=USER_STATEMENT_TIMEOUT_MS,
+            bulk=is_read_only_query(query)
+        )
+    return result if result is not None else pd.DataFrame(), elapsed_ms, plan
@@ -0,0 +1,45 @@
+import os
+import secrets
+import time
+from db_utils import admitted, get_worker_pool, get_session_id
+from scratch import get_scratch_info
+
+# Downloads of query results. A worker COPYs the result straight into a file
+# under static/, which Streamlit's static file serving streams to the browser
+# in chunks, so neither the export nor the download ever holds the whole
+# result in memory. Needs server.enableStaticServing (.streamlit/config.toml).
+
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "exports")
+EXPORT_URL = "app/static/exports"
+EXPORT_FORMATS = ["csv", "parquet"]
+# Streamlit doesn't serve static files above 200 MB
+MAX_EXPORT_BYTES = 200 * 1024 * 1024
+EXPORT_TIMEOUT_MS = 120000
+# Seconds an export stays downloadable
+EXPORT_TTL_SECONDS = 60 * 60
+
+
+def _remove_expired_exports():
+    now = time.time()
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        if now - os.path.getmtime(path) > EXPORT_TTL_SECONDS:
+            os.remove(path)
+
+# Export a read-only query's result and return its download URL, row count
+# and size. File names are random, so an export is only reachable by its link.
+def export_query(query, file_format):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _remove_expired_exports()
+    filename = f"{secrets.token_urlsafe(16)}.{file_format}"
+    scratch = get_scratch_info(get_session_id())
+    with admitted():
+        export = get_worker_pool().export(
+            query,
+            os.path.join(EXPORT_DIR, filename),
+            file_format,
+            max_bytes=MAX_EXPORT_BYTES,
+            timeout_ms=EXPORT_TIMEOUT_MS,
+            search_path=scratch["schema"] if scratch else None
+        )
+    return {"url": f"{EXPORT_URL}/{filename}", **export}
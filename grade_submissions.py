@@ -0,0 +1,252 @@
+# Offline grader for take-home assignments. Reads submissions as a JSONL or
+# CSV file of (learner, level, stage, sql) rows, with levels by key (see
+# levels.py) and stages counted from 1, and grades them by the same rules as
+# the level pages (see grading.py). Submissions are deduplicated first, by
+# text and then by canonical fingerprint (and, for levels graded on the
+# answer's text, by normalized answer too), so each distinct query for a
+# stage runs once, spread over a pool of worker processes. Writes one result per
+# submission (CSV or JSONL, by extension) and a per-stage summary.
+#
+# Queries run against an embedded SQLite copy of db/*.csv by default, or
+# against a local Postgres loaded with db/init.sql (and db/scaled.sql for the
+# Quasar level, which the SQLite copy can't grade). Usage:
+#   python grade_submissions.py SUBMISSIONS RESULTS [--db-url DB_URL] [--workers N]
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import psycopg2
+from grading import TIMEOUT_FACTOR, answer_fingerprint, answer_matches, results_match, judge_budget, timeout_feedback
+from levels import LEVELS
+from sql_utils import classify_statement, fingerprint_sql, READ
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db")
+# Statement timeout for queries without a time budget
+DEFAULT_TIMEOUT_MS = 10000
+# Distinct queries sent to a worker at a time
+CHUNK_SIZE = 16
+COLUMNS = ["learner", "level", "stage", "sql"]
+
+
+# Each worker's engine: ("sqlite", connection) or ("postgres", connection)
+_engine = None
+# (search_path, query) -> reference result, per worker
+_references = {}
+
+
+def build_sqlite_copy(path):
+    conn = sqlite3.connect(path)
+    for csv_path in sorted(glob.glob(os.path.join(DATA_DIR, "*.csv"))):
+        table = os.path.splitext(os.path.basename(csv_path))[0]
+        pd.read_csv(csv_path).to_sql(table, conn, index=False)
+    conn.close()
+
+def init_worker(sqlite_path, db_url):
+    global _engine
+    if db_url:
+        conn = psycopg2.connect(db_url)
+        conn.set_session(readonly=True, autocommit=True)
+        _engine = ("postgres", conn)
+    else:
+        _engine = ("sqlite", sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True))
+
+# Run a read-only query; returns (frame, elapsed ms). Raises TimeoutError
+# once timeout_ms is up.
+def run_query(query, search_path=None, timeout_ms=DEFAULT_TIMEOUT_MS):
+    kind, conn = _engine
+    if kind == "postgres":
+        cur = conn.cursor()
+        try:
+            cur.execute("SET search_path TO %s", (search_path or "public",))
+            cur.execute("SET statement_timeout = %s", (int(timeout_ms),))
+            start = time.perf_counter()
+            try:
+                cur.execute(query)
+            except psycopg2.extensions.QueryCanceledError:
+                raise TimeoutError
+            rows = cur.fetchall() if cur.description else []
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            columns = [desc[0] for desc in cur.description] if cur.description else []
+        finally:
+            cur.close()
+    else:
+        if search_path not in (None, "public"):
+            raise LookupError(f"The {search_path} schema needs Postgres (--db-url)")
+        deadline = time.perf_counter() + timeout_ms / 1000
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, 10000)
+        start = time.perf_counter()
+        try:
+            cur = conn.execute(query)
+            rows = cur.fetchall()
+        except sqlite3.OperationalError as e:
+            if time.perf_counter() > deadline:
+                raise TimeoutError from e
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        columns = [desc[0] for desc in cur.description] if cur.description else []
+    return pd.DataFrame(rows, columns=columns), elapsed_ms
+
+def reference_result(search_path, query):
+    key = (search_path, query)
+    if key not in _references:
+        _references[key] = run_query(query, search_path)[0]
+    return _references[key]
+
+
+# Grade one distinct (level, stage, query); stage counts from 0
+def grade(job):
+    level = LEVELS[job["level"]]
+    i, query = job["stage"], job["sql"]
+    verdict = {"correct": False, "rows": None, "elapsed_ms": None, "feedback": []}
+    kind, reason = classify_statement(query)
+    if kind != READ:
+        verdict["feedback"].append(reason or "Only SELECT queries can be graded here.")
+        if level.get("grading", "answer") == "answer":
+            verdict["correct"] = answer_matches(query, level["correct_answers"][i])
+        return verdict
+
+    if level.get("grading", "answer") == "result_and_budget":
+        budget_ms = level["budgets_ms"][i]
+        try:
+            result, elapsed_ms = run_query(query, level["search_path"], budget_ms * TIMEOUT_FACTOR)
+            expected = reference_result(level["search_path"], level["reference_queries"][i])
+        except TimeoutError:
+            verdict["feedback"].append(timeout_feedback(budget_ms))
+            return verdict
+        except Exception as e:
+            verdict["feedback"].append(f"Error: {e}")
+            return verdict
+        verdict["correct"], advice = judge_budget(results_match(result, expected), elapsed_ms, budget_ms)
+        verdict.update(rows=len(result), elapsed_ms=round(elapsed_ms, 1))
+        verdict["feedback"] += [f"{elapsed_ms:.1f} ms (budget {budget_ms} ms)"] + advice
+        return verdict
+
+    # Graded on its text, like the level pages; run for its row count
+    verdict["correct"] = answer_matches(query, level["correct_answers"][i])
+    try:
+        result, elapsed_ms = run_query(query)
+        verdict.update(rows=len(result), elapsed_ms=round(elapsed_ms, 1))
+    except TimeoutError:
+        verdict["feedback"].append(f"Cancelled after {DEFAULT_TIMEOUT_MS} ms.")
+    except Exception as e:
+        verdict["feedback"].append(f"Error: {e}")
+    return verdict
+
+
+# (canonical fingerprint, answer fingerprint) of a submission's text
+def fingerprint(query):
+    return fingerprint_sql(query), answer_fingerprint(query)
+
+
+def read_submissions(path):
+    if path.endswith(".csv"):
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    else:
+        with open(path, encoding="utf-8") as submissions:
+            frame = pd.DataFrame([json.loads(line) for line in submissions if line.strip()])
+    missing = [column for column in COLUMNS if column not in frame]
+    if missing:
+        sys.exit(f"{path} is missing the columns: {', '.join(missing)}")
+    frame = frame[COLUMNS].astype(str)
+    frame["stage"] = pd.to_numeric(frame["stage"], errors="coerce").astype("Int64")
+    return frame
+
+def write_frame(frame, path):
+    if path.endswith(".csv"):
+        frame.to_csv(path, index=False)
+    else:
+        frame.to_json(path, orient="records", lines=True, force_ascii=False)
+
+# Why a submission can't be graded at all, or None
+def ungradable(level, stage):
+    if level not in LEVELS:
+        return f"Unknown level {level}"
+    if pd.isna(stage) or not 1 <= stage <= len(LEVELS[level]["stages"]):
+        return f"{LEVELS[level]['title']} has no stage {stage}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade a file of SQL Galaxy submissions.")
+    parser.add_argument("submissions", help="JSONL or CSV with learner, level, stage and sql")
+    parser.add_argument("results", help="where to write one result per submission (.csv or .jsonl)")
+    parser.add_argument("--db-url", help="grade on this Postgres instead of an embedded SQLite copy")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--summary", help="where to write the per-stage summary (default: next to the results)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    submissions = read_submissions(args.submissions)
+    submissions["problem"] = [ungradable(level, stage) for level, stage in zip(submissions["level"], submissions["stage"])]
+
+    with tempfile.TemporaryDirectory() as scratch:
+        sqlite_path = os.path.join(scratch, "galaxy.sqlite3")
+        if not args.db_url:
+            build_sqlite_copy(sqlite_path)
+        with ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(sqlite_path, args.db_url)) as pool:
+            # Identical texts are fingerprinted once, identical fingerprints graded once
+            texts = submissions["sql"].unique().tolist()
+            fingerprints = dict(zip(texts, pool.map(fingerprint, texts, chunksize=CHUNK_SIZE * 4)))
+            submissions["fingerprint"] = submissions["sql"].map(lambda sql: fingerprints[sql][0])
+            # Levels graded on the answer's text also tell answers apart that
+            # only the normalized text does, as the level pages' verdict memo
+            answer_graded = submissions["level"].map(lambda level: LEVELS.get(level, {}).get("grading", "answer") == "answer")
+            submissions["answer"] = [
+                fingerprints[sql][1] if graded else "" for sql, graded in zip(submissions["sql"], answer_graded)
+            ]
+            gradable = submissions[submissions["problem"].isna()]
+            distinct = gradable.drop_duplicates(["level", "stage", "fingerprint", "answer"])
+            jobs = [
+                {"level": level, "stage": int(stage) - 1, "sql": sql}
+                for level, stage, sql in zip(distinct["level"], distinct["stage"], distinct["sql"])
+            ]
+            verdicts = dict(zip(
+                zip(distinct["level"], distinct["stage"], distinct["fingerprint"], distinct["answer"]),
+                pool.map(grade, jobs, chunksize=CHUNK_SIZE),
+            ))
+
+    results = []
+    for submission in submissions.itertuples(index=False):
+        if submission.problem:
+            verdict = {"correct": False, "rows": None, "elapsed_ms": None, "feedback": [submission.problem]}
+        else:
+            verdict = verdicts[(submission.level, submission.stage, submission.fingerprint, submission.answer)]
+        results.append({
+            "learner": submission.learner,
+            "level": submission.level,
+            "stage": submission.stage,
+            "fingerprint": submission.fingerprint,
+            "correct": verdict["correct"],
+            "rows": verdict["rows"],
+            "elapsed_ms": verdict["elapsed_ms"],
+            "feedback": " ".join(verdict["feedback"]),
+        })
+    results = pd.DataFrame(results).astype({"rows": "Int64"})
+    write_frame(results, args.results)
+
+    summary = results.groupby(["level", "stage"]).agg(
+        submissions=("learner", "size"),
+        learners=("learner", "nunique"),
+        distinct_queries=("fingerprint", "nunique"),
+    )
+    summary["solved"] = results[results["correct"]].groupby(["level", "stage"])["learner"].nunique()
+    summary = summary.fillna({"solved": 0}).astype({"solved": int}).reset_index()
+    summary_path = args.summary or os.path.splitext(args.results)[0] + "_summary.csv"
+    summary.to_csv(summary_path, index=False)
+
+    elapsed = time.perf_counter() - started
+    print(summary.to_string(index=False))
+    print(
+        f"\nGraded {len(results):,} submissions ({len(verdicts):,} distinct queries) in {elapsed:.1f} s: "
+        f"{int(results['correct'].sum()):,} correct. Results in {args.results}, summary in {summary_path}."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import hashlib
+from sql_utils import normalize_sql, sanitize_sql_input
+
+# Grading rules shared by the level pages (stage_utils), the query workers
+# and the offline grader (grade_submissions.py). Free of Streamlit and of any
+# database connection, so all of them grade a submission the same way.
+
+# Multiple of a stage's time budget after which a query is cancelled outright
+TIMEOUT_FACTOR = 5
+
+
+# Normalized text of a query, as answers are compared
+def normalize_answer(query):
+    return normalize_sql(sanitize_sql_input(query)).lower().strip(';')
+
+# Short hash of a query's normalized text: queries with the same one get the
+# same "answer" verdict
+def answer_fingerprint(query):
+    return hashlib.sha1(normalize_answer(query).encode("utf-8")).hexdigest()[:16]
+
+# "answer" grading: the query's normalized text is one of the accepted answers
+def answer_matches(user_answer, correct_answers):
+    return normalize_answer(user_answer) in {normalize_answer(answer) for answer in correct_answers}
+
+# Same rows in any order, ignoring column names
+def results_match(result, expected):
+    if result.shape[1] != expected.shape[1]:
+        return False
+    def rows(df):
+        return sorted(tuple(str(value) for value in row) for row in df.itertuples(index=False))
+    return rows(result) == rows(expected)
+
+# "result_and_budget" grading once the rows are compared: (correct, feedback)
+def judge_budget(rows_match, elapsed_ms, budget_ms):
+    feedback = []
+    if not rows_match:
+        feedback.append("The rows don't match the expected result yet.")
+    elif elapsed_ms > budget_ms:
+        feedback.append("Correct result, but over budget. Look for a plan that avoids reading every row.")
+    return rows_match and elapsed_ms <= budget_ms, feedback
+
+def timeout_feedback(budget_ms):
+    return f"⏱️ Cancelled after {budget_ms * TIMEOUT_FACTOR} ms, the budget is {budget_ms} ms."
@@ -0,0 +1,228 @@
+import re
+import psycopg2
+import streamlit as st
+import pandas as pd
+from db_utils import connection_params, admitted
+from sql_utils import canonicalize_sql, fingerprint_sql, is_read_only_query
+
+# Columns of the galaxy tables (see db/init.sql)
+GALAXY_SCHEMA = {
+    "planets": ["planet_id", "planet_name", "distance_from_earth", "discoverer", "discovery_year"],
+    "missions": ["mission_id", "planet_id", "mission_name", "mission_date", "crew_size"],
+    "moons": ["moon_id", "moon_name", "planet_id", "diameter_km", "discovered_by", "discovery_year"],
+}
+
+# The sample tables only hold a handful of rows, so without HypoPG the advisor
+# re-plans against temporary copies replicated this many times
+ADVISOR_SCALE = 2000
+
+# Words that can follow a table name but are never an alias
+NOT_AN_ALIAS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using",
+    "group", "order", "limit", "offset", "having", "union", "intersect", "except", "window",
+    "inner join", "left join", "right join", "full join", "cross join", "left outer join",
+    "right outer join", "full outer join", "group by", "order by", "as",
+}
+
+COLUMN_REF = r"((?:[a-z_][a-z0-9_]*\.)?[a-z_][a-z0-9_]*)"
+COMPARISON = re.compile(COLUMN_REF + r"\s+(=|<>|!=|<=|>=|<|>|like|ilike|in|between|is)\s+(\S+)")
+ORDER_BY = re.compile(r"order by (.*?)(?= limit | offset | \)|$)")
+
+
+# Map every alias (and table name) used in the query to its galaxy table
+def _alias_map(canonical):
+    aliases = {}
+    pattern = r"\b(" + "|".join(GALAXY_SCHEMA) + r")\b(?!\.)(?:\s+(?:as\s+)?([a-z_][a-z0-9_]*))?"
+    for table, alias in re.findall(pattern, canonical):
+        aliases[table] = table
+        if alias and alias not in NOT_AN_ALIAS and alias not in GALAXY_SCHEMA:
+            aliases[alias] = table
+    return aliases
+
+
+# Resolve "alias.column" or a bare column to (table, column)
+def _resolve_column(ref, aliases):
+    if "." in ref:
+        alias, column = ref.split(".", 1)
+        table = aliases.get(alias)
+        if table and column in GALAXY_SCHEMA[table]:
+            return table, column
+        return None
+    owners = {table for table in aliases.values() if ref in GALAXY_SCHEMA[table]}
+    if len(owners) == 1:
+        return owners.pop(), ref
+    return None
+
+
+# Inspect predicates, join keys and ORDER BY columns and propose indexes
+def find_index_candidates(query):
+    canonical = canonicalize_sql(query)
+    aliases = _alias_map(canonical)
+    equality, ranges, joins, ordering = {}, {}, {}, {}
+
+    for left, operator, right in COMPARISON.findall(canonical):
+        column = _resolve_column(left, aliases)
+        if column is None:
+            continue
+        other = _resolve_column(right, aliases) if operator == "=" else None
+        if other is not None:
+            # Join key: both sides are worth an index
+            for table, name in (column, other):
+                joins.setdefault(table, []).append(name)
+        elif operator in ("=", "in", "is"):
+            equality.setdefault(column[0], []).append(column[1])
+        else:
+            ranges.setdefault(column[0], []).append(column[1])
+
+    for clause in ORDER_BY.findall(canonical):
+        for item in clause.split(","):
+            ref = item.strip().split(" ")[0]
+            column = _resolve_column(ref, aliases)
+            if column is not None:
+                ordering.setdefault(column[0], []).append(column[1])
+
+    candidates = []
+
+    def add(table, columns, reason):
+        columns = tuple(dict.fromkeys(columns))
+        if columns and columns != (GALAXY_SCHEMA[table][0],):  # primary key is already indexed
+            if (table, columns) not in [(c["table"], c["columns"]) for c in candidates]:
+                candidates.append({"table": table, "columns": columns, "reason": reason})
+
+    for table, columns in equality.items():
+        for column in columns:
+            add(table, [column], "equality filter")
+    for table, columns in ranges.items():
+        for column in columns:
+            add(table, [column], "range filter")
+    for table, columns in joins.items():
+        for column in columns:
+            add(table, [column], "join key")
+    for table, columns in ordering.items():
+        # Equality columns first, then the sort keys, so one index serves both
+        if equality.get(table):
+            add(table, equality[table][:2] + columns[:1], "filter + sort")
+        add(table, columns, "order by")
+    return candidates
+
+
+# Leading columns of the existing indexes per table
+def _existing_indexes(cur):
+    cur.execute("SELECT tablename, indexdef FROM pg_indexes WHERE schemaname = 'public'")
+    existing = {}
+    for table, indexdef in cur.fetchall():
+        match = re.search(r"\((.*)\)", indexdef)
+        if match:
+            columns = tuple(c.strip().strip('"') for c in match.group(1).split(","))
+            existing.setdefault(table, []).append(columns)
+    return existing
+
+
+def _is_covered(columns, indexes):
+    return any(index[:len(columns)] == columns for index in indexes)
+
+
+# Planner cost of a query and the index names its plan uses
+def _plan(cur, query):
+    cur.execute("EXPLAIN (FORMAT JSON) " + query)
+    plan = cur.fetchone()[0][0]["Plan"]
+    used, nodes = set(), [plan]
+    while nodes:
+        node = nodes.pop()
+        if "Index Name" in node:
+            used.add(node["Index Name"])
+        nodes.extend(node.get("Plans", []))
+    return plan["Total Cost"], used
+
+
+def _has_hypopg(cur):
+    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'hypopg'")
+    return cur.fetchone() is not None
+
+
+# Re-plan the query with each candidate index and measure the cost change.
+# Uses HypoPG when installed; otherwise builds real indexes on temporary,
+# scaled copies of the tables inside a transaction that is always rolled back.
+def estimate_index_benefit(query, candidates, scale=ADVISOR_SCALE):
+    with admitted():
+        return _estimate_index_benefit(query, candidates, scale)
+
+def _estimate_index_benefit(query, candidates, scale):
+    # Errors are raised, not reported, so a failed analysis is never cached
+    conn = psycopg2.connect(**connection_params())
+    results = []
+    try:
+        cur = conn.cursor()
+        existing = _existing_indexes(cur)
+        candidates = [c for c in candidates if not _is_covered(c["columns"], existing.get(c["table"], []))]
+        if not candidates:
+            return []
+
+        if _has_hypopg(cur):
+            method = "hypopg"
+        else:
+            method = f"temp copy x{scale}"
+            for table in set(_alias_map(canonicalize_sql(query)).values()):
+                # Temporary tables shadow the public ones for the rest of the transaction
+                cur.execute(
+                    f"CREATE TEMP TABLE {table} ON COMMIT DROP AS "
+                    f"SELECT t.* FROM public.{table} t CROSS JOIN generate_series(1, %s)",
+                    (scale,)
+                )
+                for columns in existing.get(table, []):
+                    cur.execute(f"CREATE INDEX ON pg_temp.{table} ({', '.join(columns)})")
+                cur.execute(f"ANALYZE pg_temp.{table}")
+
+        baseline_cost, _ = _plan(cur, query)
+        for candidate in candidates:
+            table, columns = candidate["table"], candidate["columns"]
+            ddl = f"CREATE INDEX idx_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
+            if method == "hypopg":
+                cur.execute("SELECT indexname FROM hypopg_create_index(%s)", (ddl,))
+                index_name = cur.fetchone()[0]
+                cost, used = _plan(cur, query)
+                cur.execute("SELECT hypopg_reset()")
+            else:
+                cur.execute("SAVEPOINT candidate")
+                index_name = f"advisor_{table}_{'_'.join(columns)}"
+                cur.execute(f"CREATE INDEX {index_name} ON pg_temp.{table} ({', '.join(columns)})")
+                cost, used = _plan(cur, query)
+                cur.execute("ROLLBACK TO SAVEPOINT candidate")
+            results.append({
+                "index": ddl + ";",
+                "reason": candidate["reason"],
+                "used_by_planner": index_name in used,
+                "baseline_cost": round(baseline_cost, 2),
+                "estimated_cost": round(cost, 2),
+                "improvement_pct": round(100 * (baseline_cost - cost) / baseline_cost, 1) if baseline_cost else 0.0,
+                "method": method,
+            })
+        cur.close()
+    finally:
+        # Nothing the advisor does is ever kept
+        if not conn.closed:
+            conn.rollback()
+        conn.close()
+    return sorted(results, key=lambda r: r["improvement_pct"], reverse=True)
+
+
+# Advice only depends on the shape of the query, so it is cached per
+# literal-free fingerprint and repeated analysis never hits the database
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_advice(fingerprint, _query):
+    candidates = find_index_candidates(_query)
+    if not candidates:
+        return pd.DataFrame()
+    return pd.DataFrame(estimate_index_benefit(_query, candidates))
+
+
+# Propose indexes for a single read-only query; None if the analysis failed
+# (the error is shown, and the next request tries again)
+def advise_indexes(query):
+    if not is_read_only_query(query):
+        return pd.DataFrame()
+    try:
+        return _cached_advice(fingerprint_sql(query, keep_literals=False), query)
+    except Exception as e:
+        st.error(f"Error analyzing indexes: {e}")
+        return None
@@ -0,0 +1,178 @@
+import threading
+import time
+import streamlit as st
+from state_backend import WriteBehindStore, get_state_backend
+
+# Leaderboards over every learner, built on aggregate rows that are updated
+# incrementally as attempts are graded, never recomputed from raw attempts.
+# Updates are deltas queued write-behind and summed while they wait, so a
+# burst of attempts is one UPSERT per learner and level. The top of each
+# board is served from a short-TTL in-memory cache; deeper pages are
+# LIMIT/OFFSET queries over indexes matching each board's order.
+
+# Seconds the top of a board is served from memory
+TOP_TTL_SECONDS = 10
+TOP_ROWS = 10
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS leaderboard_levels (
+        learner TEXT NOT NULL,
+        level TEXT NOT NULL,
+        attempts INTEGER NOT NULL,
+        stages_solved INTEGER NOT NULL,
+        started_at {real} NOT NULL,
+        completed_at {real},
+        completion_seconds {real},
+        PRIMARY KEY (learner, level)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leaderboard_learners (
+        learner TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        attempts INTEGER NOT NULL,
+        stages_solved INTEGER NOT NULL,
+        levels_completed INTEGER NOT NULL
+    )
+    """,
+    # One index per board, in the board's order, covering completed levels only
+    """
+    CREATE INDEX IF NOT EXISTS leaderboard_fastest
+    ON leaderboard_levels (level, completion_seconds, attempts) WHERE completed_at IS NOT NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS leaderboard_fewest_attempts
+    ON leaderboard_levels (level, attempts, completion_seconds) WHERE completed_at IS NOT NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS leaderboard_most_solved
+    ON leaderboard_learners (stages_solved DESC, attempts)
+    """,
+]
+
+LEVEL_UPSERT_SQL = """
+INSERT INTO leaderboard_levels (learner, level, attempts, stages_solved, started_at, completed_at, completion_seconds)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (learner, level) DO UPDATE SET
+    attempts = leaderboard_levels.attempts + excluded.attempts,
+    stages_solved = leaderboard_levels.stages_solved + excluded.stages_solved,
+    started_at = {least}(leaderboard_levels.started_at, excluded.started_at),
+    completed_at = COALESCE(leaderboard_levels.completed_at, excluded.completed_at),
+    completion_seconds = COALESCE(
+        leaderboard_levels.completion_seconds,
+        excluded.completed_at - {least}(leaderboard_levels.started_at, excluded.started_at)
+    )
+"""
+
+LEARNER_UPSERT_SQL = """
+INSERT INTO leaderboard_learners (learner, name, attempts, stages_solved, levels_completed)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (learner) DO UPDATE SET
+    name = excluded.name,
+    attempts = leaderboard_learners.attempts + excluded.attempts,
+    stages_solved = leaderboard_learners.stages_solved + excluded.stages_solved,
+    levels_completed = leaderboard_learners.levels_completed + excluded.levels_completed
+"""
+
+# Board -> (columns, ranking query, count query). Per-level boards take the
+# level as their first parameter.
+BOARDS = {
+    "fastest": (
+        ["Astronaut", "Seconds", "Attempts"],
+        "SELECT l.name, b.completion_seconds, b.attempts FROM leaderboard_levels b "
+        "JOIN leaderboard_learners l ON l.learner = b.learner "
+        "WHERE b.level = ? AND b.completed_at IS NOT NULL "
+        "ORDER BY b.completion_seconds, b.attempts LIMIT ? OFFSET ?",
+        "SELECT COUNT(*) FROM leaderboard_levels WHERE level = ? AND completed_at IS NOT NULL",
+    ),
+    "fewest_attempts": (
+        ["Astronaut", "Attempts", "Seconds"],
+        "SELECT l.name, b.attempts, b.completion_seconds FROM leaderboard_levels b "
+        "JOIN leaderboard_learners l ON l.learner = b.learner "
+        "WHERE b.level = ? AND b.completed_at IS NOT NULL "
+        "ORDER BY b.attempts, b.completion_seconds LIMIT ? OFFSET ?",
+        "SELECT COUNT(*) FROM leaderboard_levels WHERE level = ? AND completed_at IS NOT NULL",
+    ),
+    "most_solved": (
+        ["Astronaut", "Stages Solved", "Levels Completed", "Attempts"],
+        "SELECT name, stages_solved, levels_completed, attempts FROM leaderboard_learners "
+        "WHERE stages_solved > 0 ORDER BY stages_solved DESC, attempts LIMIT ? OFFSET ?",
+        "SELECT COUNT(*) FROM leaderboard_learners WHERE stages_solved > 0",
+    ),
+}
+PER_LEVEL_BOARDS = {"fastest", "fewest_attempts"}
+
+
+class Leaderboard(WriteBehindStore):
+    SCHEMA = SCHEMA
+
+    def __init__(self, backend, **kwargs):
+        super().__init__(backend, **kwargs)
+        # (board, level) -> (expires_at, rows, total)
+        self._top = {}
+        self._top_lock = threading.Lock()
+
+    # Record one graded attempt. solved: the attempt solved a stage for the
+    # first time; completed: it solved the level's last unsolved stage.
+    def record_attempt(self, learner, name, level, solved=False, completed=False):
+        now = time.time()
+        self._queue((learner, level), {
+            "name": name,
+            "attempts": 1,
+            "stages_solved": int(solved),
+            "started_at": now,
+            "completed_at": now if completed else None,
+        })
+
+    # Deltas for the same learner and level add up while they wait
+    def _merge(self, pending, value):
+        return {
+            "name": value["name"],
+            "attempts": pending["attempts"] + value["attempts"],
+            "stages_solved": pending["stages_solved"] + value["stages_solved"],
+            "started_at": min(pending["started_at"], value["started_at"]),
+            "completed_at": pending["completed_at"] or value["completed_at"],
+        }
+
+    def _write(self, cur, sql, batch):
+        level_rows, learners = [], {}
+        for (learner, level), delta in batch.items():
+            completed_at = delta["completed_at"]
+            level_rows.append((
+                learner, level, delta["attempts"], delta["stages_solved"], delta["started_at"],
+                completed_at, completed_at - delta["started_at"] if completed_at else None,
+            ))
+            totals = learners.setdefault(learner, [delta["name"], 0, 0, 0])
+            totals[0] = delta["name"]
+            totals[1] += delta["attempts"]
+            totals[2] += delta["stages_solved"]
+            totals[3] += 1 if completed_at else 0
+        cur.executemany(sql(LEVEL_UPSERT_SQL), level_rows)
+        cur.executemany(sql(LEARNER_UPSERT_SQL), [(learner, *totals) for learner, totals in learners.items()])
+
+    # One page of a board: (rows, total ranked)
+    def page(self, board, level=None, offset=0, limit=TOP_ROWS):
+        _, ranking_sql, count_sql = BOARDS[board]
+        scope = (level,) if board in PER_LEVEL_BOARDS else ()
+        rows = self._read(ranking_sql, scope + (limit, offset))
+        total = self._read(count_sql, scope)[0][0]
+        return rows, total
+
+    # The top of a board, from memory while fresh
+    def top(self, board, level=None):
+        key = (board, level)
+        with self._top_lock:
+            entry = self._top.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1], entry[2]
+        rows, total = self.page(board, level, 0, TOP_ROWS)
+        with self._top_lock:
+            self._top[key] = (time.monotonic() + TOP_TTL_SECONDS, rows, total)
+        return rows, total
+
+
+# One leaderboard per server process, in the shared state backend
+@st.cache_resource
+def get_leaderboard():
+    return Leaderboard(get_state_backend())
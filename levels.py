@@ -0,0 +1,328 @@
+import pandas as pd
+
+# Stage content for every level: stages, questions, accepted answers, hints
+# and messages. The level pages render these with stage_utils.render_stage,
+# and grade_submissions.py grades files of submissions against them, so this
+# module only depends on pandas. Each level is a dict:
+#   key, title                                      - identity
+#   stages, questions, correct_answers, hints       - stage content
+#   success_message, final_message                  - formatted with name/stage
+#   expected_output(i)                              - optional extra section
+#   grading                                         - "answer" (default) or "result_and_budget"
+# Levels graded by "result_and_budget" also set
+#   search_path, reference_queries, budgets_ms
+
+# Define stages, questions, answers, hints, and explanations
+milky_way_stages = [
+    "Mapping the Solar System ",
+    "Assessing Past Missions",
+    "Uncovering Ancient Knowledge",
+    "Navigating Modern Missions",
+    "Searching the T-Moons"
+]
+# Define storylines and questions in a list format
+milky_way_questions = [
+    "Your rocket ship's navigation system is down. To proceed, you must map the planets in the solar system by retrieving all records from the planets table.\n\n*Retrieve all records from the planets table.*",
+    
+    "Before continuing your journey, you need to understand the scope of previous space expeditions. Count the number of missions in the missions table to gain insights.\n\n*How would you count the number of missions in the missions table?*",
+    
+    "Ancient civilizations hold the key to your next fuel boost. Discover who first identified Venus to unlock the next stage of your journey.\n\n*What is the SQL query to find the discoverer of the planet Venus?*",
+    
+    "Modern space missions contain vital data for your next fuel boost. Retrieve all missions launched after 1999 to move forward.\n\n*Write a SQL query to retrieve all missions after the year 1999.*",
+    
+    "To unlock the final fuel reserves, you must locate all moons that begin with the letter 'T'. This is your last challenge before you can return home.\n\n*Write a SQL query to return all the moon names that start with the letter 'T'.*"
+]
+
+
+
+milky_way_correct_answers = [
+    ["select * from planets", "select planet_id, planet_name, distance_from_sun, discoverer from planets"],
+    ["select count(*) from missions", "SELECT COUNT (*) FROM missions"],
+    ["select discoverer from planets where planet_name = 'venus'", "select discoverer from planets where planet_id = 6"],
+    ["select * from missions where mission_date > '1999-12-31'", "select * from missions where extract(year from mission_date) > 1999"],
+    ["select moon_name from moons where moon_name like 't%'", "select moon_name from moons where moon_name ilike 't%'"]
+]
+
+milky_way_hints = [
+    ["Start with `SELECT` `*` `FROM`...", "The table you need is `planets`."],
+    ["Use `COUNT` `(*)` to count rows.", "The table you need is `missions`."],
+    ["`SELECT` only the `discoverer` column","Filter the `planets` table `WHERE` `planet_name` `=` `'Venus'`."],
+    ["Filter `mission_date` `>` `1999-12-31`.", "Use the `WHERE` clause with `mission_date` `>` `'1999-12-31'`."],
+    ["Use `LIKE` `'T%'` to find names starting with `'T'`.", "The table you need is `moons` and the column is `moon_name`."]
+]
+
+def milky_way_expected_output(stage):
+    if stage == 0:
+        # Expected output for Stage 1: Retrieve all records from the planets table
+        return pd.DataFrame({
+            "planet_id": [1, 2, 3, 4, 5, 6, 7, 8, 9],
+            "planet_name": ["Venus", "Mars", "Jupiter", "Saturn", "Neptune", "Pluto", "Uranus", "Mercury", "Earth"],
+            "distance_from_earth": [108, 225, 778, 1_433, 4_495, 5_906, 2_871, 77, 0],
+            "discoverer": ["Babylonians", "Galileo", "Galileo", "Huygens", "Le Verrier", "Tombaugh", "William Herschel", "Known since antiquity", "Known since antiquity"],
+            "discovery_year": [-500, 1610, 1610, 1655, 1846, 1930, 1781, None, None]
+        })
+
+    elif stage == 1:
+        # Expected output for Stage 2: Count the number of missions in the missions table
+        return pd.DataFrame({
+            "count": [11]
+        })
+
+    elif stage == 2:
+        # Expected output for Stage 3: Discover who first identified Venus
+        return pd.DataFrame({
+            "discoverer": ["Babylonians"]
+        })
+
+    elif stage == 3:
+        # Expected output for Stage 4: Retrieve all missions launched after 1999
+        return pd.DataFrame({
+            "mission_id": [1, 4, 6, 10, 11],
+            "planet_id": [1, 3, 5, 8, 8, ],
+            "mission_name": ["Mars Rover Mission", "Saturn Orbiter", "Pluto Flyby", "MESSENGER", "BepiColombo"],
+            "mission_date": ["2004-01-04","2004-07-01", "2015-07-14", "2004-08-03", "2018-10-20"],
+            "crew_size": [6, 3, 3, 0, 0]
+        })
+
+    elif stage == 4:
+        # Expected output for Stage 5: Return all the moons that start with the letter 'T'
+        return pd.DataFrame({
+            "moon_name": ["Triton", "Titan"]
+        })
+
+
+
+    else:
+        # Default case if the stage is out of range
+        return pd.DataFrame({
+            "Result": ["No expected output available"]
+        })
+
+MILKY_WAY = {
+    "key": "milky_way",
+    "title": "Milky Way (Beginner)",
+    "stages": milky_way_stages,
+    "questions": milky_way_questions,
+    "correct_answers": milky_way_correct_answers,
+    "hints": milky_way_hints,
+    "success_message": "Good job, {name}! You've completed Stage {stage}.",
+    "final_message": "Well Done, {name}! 🎉 You've completed the Hero's Journey!",
+    "expected_output": milky_way_expected_output,
+}
+
+
+# Define stages, questions, answers, hints, and explanations for Intermediate
+hydra_cluster_stages = [
+    "Unveiling the Major Expeditions",
+    "Largest Moons and Missions",
+    "Mars Missions and Their Moons",
+    "Planets with Null Discovery Year",
+    "Galileo Discoveries and Their Missions"
+]
+
+hydra_cluster_questions = [
+    "The Hydra Cluster's archives hold records of many space missions, some with crews larger than three. To unlock your next fuel boost, you need to retrieve the details of these missions. Your goal is to identify the largest crews in order to proceed.\n\n*Retrieve the planet name, mission name, and crew size for missions that had a crew size larger than three, ordered by crew size from largest to smallest.*",
+    
+    "The largest moon in the database holds clues to your next destination. To proceed, you need to find this moon and the mission associated with its planet.\n\n*Find the largest moon and the mission to its planet.*",
+    
+    "Mars is a hub of activity with multiple missions and moons. To navigate this stage, you need to retrieve missions to Mars along with their crew sizes and the names of Mars's moons.\n\n*Retrieve missions to Mars and their crew sizes and moons.*",
+    
+    "Some planets have mysterious origins with unknown discovery years. To uncover these mysteries, retrieve the mission name, discovery year, and mission date for planets with a NULL discovery year.\n\n*Return the mission name, discovery year, and mission date for planets with a NULL discovery year.*",
+    
+    "Galileo's discoveries are key to unlocking this stage. You need to find all missions to planets discovered by Galileo and their mission dates.\n\n*Retrieve the mission_name and mission_date for planets discovered by Galileo.*"
+]
+
+hydra_cluster_correct_answers = [
+    [
+        "SELECT planet_name, mission_name, crew_size FROM missions INNER JOIN planets ON missions.planet_id = planets.planet_id WHERE crew_size > 3 ORDER BY crew_size DESC;",
+        "SELECT p.planet_name, m.mission_name, m.crew_size FROM missions m INNER JOIN planets p ON m.planet_id = p.planet_id WHERE m.crew_size > 3 ORDER BY m.crew_size DESC;"
+    ],
+    [
+        "SELECT moon_name, mission_name FROM moons INNER JOIN missions ON moons.planet_id = missions.planet_id ORDER BY diameter_km DESC LIMIT 1;",
+        "SELECT m.moon_name, mi.mission_name FROM moons m INNER JOIN missions mi ON m.planet_id = mi.planet_id ORDER BY m.diameter_km DESC LIMIT 1;"
+    ],
+    [
+        "SELECT mission_name, moon_name, crew_size FROM missions INNER JOIN planets ON missions.planet_id = planets.planet_id INNER JOIN moons ON moons.planet_id = planets.planet_id WHERE planet_name = 'Mars';",
+        "SELECT mi.mission_name, mo.moon_name, mi.crew_size FROM missions mi INNER JOIN planets p ON mi.planet_id = p.planet_id INNER JOIN moons mo ON mo.planet_id = p.planet_id WHERE p.planet_name = 'Mars';"
+    ],
+    [
+        "SELECT mission_name, discovery_year, mission_date FROM missions INNER JOIN planets ON missions.planet_id = planets.planet_id WHERE discovery_year IS NULL;",
+        "SELECT mi.mission_name, p.discovery_year, mi.mission_date FROM missions mi INNER JOIN planets p ON mi.planet_id = p.planet_id WHERE p.discovery_year IS NULL;"
+    ],
+    [
+        "SELECT mission_name, mission_date FROM missions INNER JOIN planets ON missions.planet_id = planets.planet_id WHERE discoverer = 'Galileo';",
+        "SELECT mi.mission_name, mi.mission_date FROM missions mi INNER JOIN planets p ON mi.planet_id = p.planet_id WHERE p.discoverer = 'Galileo';"
+    ]
+]
+
+hydra_cluster_hints = [
+    ["Use INNER JOIN to combine the missions and planets tables.", "Filter by crew_size > 3 and order by crew_size DESC."],
+    ["Use ORDER BY diameter_km DESC.", "Use LIMIT 1 to find the largest moon and its mission."],
+    ["Use INNER JOIN on missions, planets, and moons.", "Filter where planet_name = 'Mars'."],
+    ["Use WHERE discovery_year IS NULL.", "Join missions and planets to get mission_name, discovery_year, and mission_date."],
+    ["Filter by discoverer = 'Galileo'.", "Join missions and planets to retrieve mission_name and mission_date."]
+]
+
+HYDRA_CLUSTER = {
+    "key": "hydra_cluster",
+    "title": "Hydra Cluster (Intermediate)",
+    "stages": hydra_cluster_stages,
+    "questions": hydra_cluster_questions,
+    "correct_answers": hydra_cluster_correct_answers,
+    "hints": hydra_cluster_hints,
+    "success_message": "Great job, {name}! You've completed Stage {stage}.",
+    "final_message": "Well Done, {name}! 🎉 You've completed the Hero's Journey!\n\nExplore the **Hercules Supercluster** section for more challenges.",
+}
+
+
+# Define stages, questions, answers, hints, and explanations for Advanced
+hercules_supercluster_stages = [
+    "The Moon Monarch",
+    "Far Reaches of Space",
+    "Beyond Average Crews",
+    "Moons and Missions",
+    "Above Average Moons"
+]
+
+hercules_supercluster_questions = [
+    "In the vastness of the Hercules Supercluster, one planet stands out with the most moons. To navigate through this region, you need to find this planet.\n\n*Find the planet with the most moons using a subquery.*",
+    
+    "The distant planets hold secrets beyond 500 million km from Earth. To proceed, you must retrieve missions heading to these far-off worlds.\n\n*Retrieve the mission name and crew size for all missions where the destination planet is further than 500 million km from Earth, using a subquery.*",
+    
+    "Elite missions often have crew sizes larger than average. Your task is to identify how many such missions exist to unlock the next phase.\n\n*Write a query to find the total number of missions where the crew size was larger than the average crew size of all missions, using a subquery.*",
+    
+    "Some missions venture to planets with numerous moons. Find these missions to chart your path forward.\n\n*Find the missions where the destination planet has more than 2 moons, using a subquery.*",
+    
+    "Planets with an above-average number of moons may harbor advanced civilizations. To make contact, you need to list these planets.\n\n*Write a query to retrieve the planets that have more moons than the average number of moons for all planets, using a CTE.*"
+]
+
+hercules_supercluster_correct_answers = [
+    # Question 1
+    [
+        "SELECT planet_name FROM planets WHERE planet_id = (SELECT planet_id FROM moons GROUP BY planet_id ORDER BY COUNT(*) DESC LIMIT 1);",
+        "SELECT p.planet_name FROM planets p WHERE p.planet_id = (SELECT m.planet_id FROM moons m GROUP BY m.planet_id ORDER BY COUNT(*) DESC LIMIT 1);"
+    ],
+    # Question 2
+    [
+        "SELECT mission_name, crew_size FROM missions WHERE planet_id IN (SELECT planet_id FROM planets WHERE distance_from_earth > 500);",
+        "SELECT m.mission_name, m.crew_size FROM missions m WHERE m.planet_id IN (SELECT p.planet_id FROM planets p WHERE p.distance_from_earth > 500);"
+    ],
+    # Question 3
+    [
+        "SELECT COUNT(*) FROM missions WHERE crew_size > (SELECT AVG(crew_size) FROM missions);",
+        "SELECT COUNT(*) AS mission_count FROM missions WHERE crew_size > (SELECT AVG(crew_size) FROM missions);"
+    ],
+    # Question 4
+    [
+        "SELECT mission_name FROM missions WHERE planet_id IN (SELECT planet_id FROM moons GROUP BY planet_id HAVING COUNT(moon_id) > 2);",
+        "SELECT m.mission_name FROM missions m WHERE m.planet_id IN (SELECT mo.planet_id FROM moons mo GROUP BY mo.planet_id HAVING COUNT(mo.moon_id) > 2);"
+    ],
+    # Question 5
+    [
+        """
+        WITH moon_counts AS (
+            SELECT planet_id, COUNT(moon_id) AS num_moons
+            FROM moons
+            GROUP BY planet_id
+        ), average_moons AS (
+            SELECT AVG(num_moons) AS avg_moons FROM moon_counts
+        )
+        SELECT planet_name
+        FROM planets
+        WHERE planet_id IN (
+            SELECT planet_id FROM moon_counts WHERE num_moons > (SELECT avg_moons FROM average_moons)
+        );
+        """,
+        """
+        WITH moon_counts AS (
+            SELECT planet_id, COUNT(moon_id) AS num_moons
+            FROM moons
+            GROUP BY planet_id
+        )
+        SELECT p.planet_name
+        FROM planets p
+        JOIN moon_counts mc ON p.planet_id = mc.planet_id
+        WHERE mc.num_moons > (SELECT AVG(num_moons) FROM moon_counts);
+        """
+    ]
+]
+
+hercules_supercluster_hints = [
+    ["Use a subquery with `GROUP BY` and `ORDER BY COUNT(*) DESC` to find the planet ID with the most moons.", "Join this subquery result with the `planets` table to get the planet name."],
+    ["Filter planets where `distance_from_earth > 500` in a subquery and use `IN` to retrieve missions to those planets.", "Alternatively, use a subquery in the `WHERE` clause of your `SELECT` statement on `missions`."],
+    ["Calculate the average crew size using `AVG(crew_size)` in a subquery.", "Use this average to find missions where `crew_size` is greater than the average."],
+    ["Use a subquery with `GROUP BY` and `HAVING COUNT(moon_id) > 2` to find planet IDs.", "Retrieve mission names where `planet_id` is in this subquery result."],
+    ["Use a CTE (`WITH` clause) to calculate the number of moons per planet.", "Calculate the average number of moons and select planets with more moons than this average."]
+]
+
+HERCULES_SUPERCLUSTER = {
+    "key": "hercules_supercluster",
+    "title": "Hercules Supercluster (Advanced)",
+    "stages": hercules_supercluster_stages,
+    "questions": hercules_supercluster_questions,
+    "correct_answers": hercules_supercluster_correct_answers,
+    "hints": hercules_supercluster_hints,
+    "success_message": "Excellent work, {name}! You've completed Stage {stage}.",
+    "final_message": "Congratulations, {name}! 🎉 You've conquered the Hercules Supercluster!",
+}
+
+
+# Define stages, questions, reference answers, budgets and hints for the Quasar level.
+# Every query runs against the million-row galaxy_scaled schema (see db/scaled.sql).
+quasar_stages = [
+    "A Decade of Launches",
+    "Latest Transmissions",
+    "Crewed Giants",
+    "Colossal Moons",
+    "The Busiest World"
+]
+
+quasar_questions = [
+    "The Quasar's flight recorder holds a million missions. Mission control needs a fast count of recent traffic per planet.\n\n*Count the missions per planet launched in the last decade (on or after 2014-01-01). Return planet_id and the count, within 50 ms.*",
+
+    "Only the freshest transmissions matter out here. Fetch the latest launches without sorting the whole archive.\n\n*Retrieve mission_name and mission_date of the 10 most recent missions, breaking ties by the highest mission_id, within 20 ms.*",
+
+    "Large crews signal an outpost. For the first worlds on the star chart, find out which ones ever received a big crew.\n\n*Return the planet_name of every planet with a planet_id below 20 that has at least one mission with a crew_size above 7, within 20 ms.*",
+
+    "Some worlds are orbited by giants. Chart every planet whose largest moon is truly colossal.\n\n*For each planet whose largest moon is wider than 5,000 km, return planet_id and that moon's diameter_km, within 100 ms.*",
+
+    "One world attracts more missions than any other. Find it before your fuel runs out.\n\n*Return the planet_name of the planet with the most missions, within 300 ms.*"
+]
+
+quasar_reference_queries = [
+    "SELECT planet_id, COUNT(*) FROM missions WHERE mission_date >= '2014-01-01' GROUP BY planet_id;",
+    "SELECT mission_name, mission_date FROM missions ORDER BY mission_date DESC, mission_id DESC LIMIT 10;",
+    "SELECT planet_name FROM planets p WHERE p.planet_id < 20 AND EXISTS (SELECT 1 FROM missions m WHERE m.planet_id = p.planet_id AND m.crew_size > 7);",
+    "SELECT planet_id, MAX(diameter_km) FROM moons GROUP BY planet_id HAVING MAX(diameter_km) > 5000;",
+    "SELECT planet_name FROM planets WHERE planet_id = (SELECT planet_id FROM missions GROUP BY planet_id ORDER BY COUNT(*) DESC LIMIT 1);"
+]
+
+# Time budget per stage in milliseconds
+quasar_budgets_ms = [50, 20, 20, 100, 300]
+
+quasar_hints = [
+    ["Compare `mission_date` directly (`>= '2014-01-01'`) so the index on `mission_date` can be used.", "Wrapping the column in `EXTRACT(YEAR FROM ...)` forces a scan of every row."],
+    ["`ORDER BY mission_date DESC` combined with `LIMIT 10` can walk the date index backwards.", "Add `mission_id DESC` as a tie-breaker."],
+    ["`EXISTS` stops at the first matching mission instead of counting them all.", "Filter `planets` by `planet_id < 20` first, then check `missions` with the index on `planet_id`."],
+    ["Use `MAX(diameter_km)` with `GROUP BY planet_id`.", "Filter the groups with `HAVING MAX(diameter_km) > 5000`."],
+    ["Aggregate `missions` by `planet_id` before joining to `planets`.", "`ORDER BY COUNT(*) DESC LIMIT 1` finds the busiest planet in one pass."]
+]
+
+QUASAR = {
+    "key": "quasar",
+    "title": "Quasar (Performance)",
+    "stages": quasar_stages,
+    "questions": quasar_questions,
+    "correct_answers": quasar_reference_queries,
+    "hints": quasar_hints,
+    "success_message": "Lightspeed, {name}! Stage {stage} solved within budget.",
+    "final_message": "Incredible, {name}! 🎉 You've tamed the Quasar!",
+    "grading": "result_and_budget",
+    "search_path": "galaxy_scaled",
+    "reference_queries": quasar_reference_queries,
+    "budgets_ms": quasar_budgets_ms,
+}
+
+
+# Every level, by key, in the order learners meet them
+LEVELS = {level["key"]: level for level in [MILKY_WAY, HYDRA_CLUSTER, HERCULES_SUPERCLUSTER, QUASAR]}
@@ -0,0 +1,224 @@
+import os
+import threading
+from contextlib import contextmanager
+import psycopg2.extensions
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import pandas as pd
+from sql_utils import subquery_sql
+
+# Type-aware result materialization. Rows are transposed into per-column
+# lists batch by batch, each column is built as one typed Arrow array chosen
+# from the Postgres type OID in cursor.description, and frames come out with
+# pandas nullable dtypes: integers with NULLs stay Int64, NUMERIC becomes
+# Float64 instead of object Decimals, and dates become datetime64.
+
+# Rows fetched per round trip
+FETCH_BATCH_ROWS = 5000
+
+# Postgres type OIDs (pg_type.oid) -> Arrow column types
+BOOL, INT8, INT2, INT4, OID, FLOAT4, FLOAT8, NUMERIC = 16, 20, 21, 23, 26, 700, 701, 1700
+NAME, TEXT, BPCHAR, VARCHAR, DATE, TIMESTAMP, TIMESTAMPTZ = 19, 25, 1042, 1043, 1082, 1114, 1184
+ARROW_TYPES = {
+    BOOL: pa.bool_(),
+    INT2: pa.int64(),
+    INT4: pa.int64(),
+    INT8: pa.int64(),
+    OID: pa.int64(),
+    FLOAT4: pa.float64(),
+    FLOAT8: pa.float64(),
+    NUMERIC: pa.float64(),
+    NAME: pa.string(),
+    TEXT: pa.string(),
+    BPCHAR: pa.string(),
+    VARCHAR: pa.string(),
+    DATE: pa.date32(),
+    TIMESTAMP: pa.timestamp("us"),
+    TIMESTAMPTZ: pa.timestamp("us", tz="UTC"),
+}
+
+# Bytes of CSV decoded per record batch in bulk mode
+COPY_BLOCK_BYTES = 1 << 20
+
+# Arrow types -> pandas nullable dtypes
+PANDAS_DTYPES = {
+    pa.bool_(): pd.BooleanDtype(),
+    pa.int64(): pd.Int64Dtype(),
+    pa.float64(): pd.Float64Dtype(),
+    pa.string(): pd.StringDtype(),
+}
+
+# NUMERIC straight to float, skipping the Decimal objects psycopg2 builds by default
+NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    (NUMERIC,), "NUMERIC_AS_FLOAT", lambda value, cur: float(value) if value is not None else None
+)
+
+
+# Register the fast typecasters on one cursor only, before it executes
+def register_fast_types(cur):
+    psycopg2.extensions.register_type(NUMERIC_AS_FLOAT, cur)
+
+
+def _column_array(type_code, values):
+    arrow_type = ARROW_TYPES.get(type_code)
+    if arrow_type is not None:
+        try:
+            return pa.array(values, type=arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if arrow_type == pa.float64():
+                # Decimals from a cursor without the fast typecasters
+                return pa.array([None if value is None else float(value) for value in values], type=arrow_type)
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed or exotic values are shown as text
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+# Fetch a cursor's rows into an Arrow table. on_batch(rows so far) is called
+# after every batch.
+def fetch_table(cur, batch_rows=FETCH_BATCH_ROWS, on_batch=None):
+    columns = None
+    fetched = 0
+    while True:
+        batch = cur.fetchmany(batch_rows)
+        if columns is None:
+            # Named cursors only have a description after the first fetch
+            columns = [[] for _ in cur.description]
+        for column, values in zip(columns, zip(*batch)):
+            column.extend(values)
+        fetched += len(batch)
+        if on_batch:
+            on_batch(fetched)
+        if len(batch) < batch_rows:
+            break
+    arrays = [_column_array(desc.type_code, values) for desc, values in zip(cur.description, columns)]
+    return pa.Table.from_arrays(arrays, names=[desc.name for desc in cur.description])
+
+
+# Bulk mode: stream COPY (query) TO STDOUT as CSV through a pipe and decode
+# it straight into Arrow record batches, with column types taken from the
+# query's type OIDs. No row tuples are ever built in Python. Only for
+# read-only SELECTs, on a connection without a wait callback (COPY isn't
+# supported in green mode). Yields (schema, record batch iterator); raises
+# pa.ArrowInvalid if a value doesn't parse as its column type (e.g.
+# 'infinity' dates), after the stream is drained.
+@contextmanager
+def copy_record_batches(cur, query):
+    query = subquery_sql(query)
+    cur.execute(f"SELECT * FROM ({query}) AS q LIMIT 0")
+    description = cur.description
+    # Types we don't map are kept as text, so every batch has the same schema
+    schema = pa.schema([(desc.name, ARROW_TYPES.get(desc.type_code, pa.string())) for desc in description])
+    # Placeholder names for the CSV reader, since result columns may repeat
+    names = [f"c{index}" for index in range(len(description))]
+
+    read_fd, write_fd = os.pipe()
+    copy_error = []
+
+    def copy():
+        try:
+            with os.fdopen(write_fd, "wb") as sink:
+                cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", sink)
+        except Exception as e:
+            copy_error.append(e)
+
+    thread = threading.Thread(target=copy, name="copy-out", daemon=True)
+    thread.start()
+    source = os.fdopen(read_fd, "rb")
+    try:
+        # An empty result is an empty stream, which the CSV reader refuses
+        empty = not source.peek(1)
+        reader = [] if empty else pacsv.open_csv(
+            source,
+            read_options=pacsv.ReadOptions(column_names=names, block_size=COPY_BLOCK_BYTES),
+            convert_options=pacsv.ConvertOptions(
+                column_types=dict(zip(names, schema.types)),
+                true_values=["t"],
+                false_values=["f"],
+                # COPY writes NULL unquoted and empty strings as ""
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False
+            )
+        )
+        yield schema, (pa.RecordBatch.from_arrays(batch.columns, schema=schema) for batch in reader)
+    except BaseException:
+        # Let COPY finish so the connection stays usable
+        while source.read(COPY_BLOCK_BYTES):
+            pass
+        thread.join()
+        if copy_error:
+            raise copy_error[0]
+        raise
+    finally:
+        source.close()
+        thread.join()
+    if copy_error:
+        raise copy_error[0]
+
+# Bulk mode into one Arrow table. on_batch(rows so far) is called after
+# every record batch.
+def copy_to_table(cur, query, on_batch=None):
+    batches = []
+    with copy_record_batches(cur, query) as (schema, reader):
+        fetched = 0
+        for batch in reader:
+            batches.append(batch)
+            fetched += batch.num_rows
+            if on_batch:
+                on_batch(fetched)
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+class ExportTooLarge(Exception):
+    pass
+
+
+# File wrapper that refuses to grow past max_bytes
+class _LimitedSink:
+    def __init__(self, sink, max_bytes):
+        self.sink = sink
+        self.max_bytes = max_bytes
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        if self.bytes > self.max_bytes:
+            raise ExportTooLarge(f"The export is larger than {self.max_bytes // (1024 * 1024)} MB.")
+        return self.sink.write(data)
+
+# Export a query's result to a CSV file with COPY. Only a buffer of it is
+# ever in memory. Returns the number of rows written.
+def copy_to_csv_file(cur, query, path, max_bytes):
+    query = subquery_sql(query)
+    with open(path, "wb") as sink:
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", _LimitedSink(sink, max_bytes))
+    return cur.rowcount
+
+# Export a query's result to a Parquet file, writing each record batch from
+# the COPY stream as it arrives. Returns the number of rows written.
+def copy_to_parquet_file(cur, query, path, max_bytes):
+    rows = 0
+    with copy_record_batches(cur, query) as (schema, reader):
+        # Parquet readers expect unique column names
+        names, seen = [], {}
+        for name in schema.names:
+            seen[name] = seen.get(name, 0) + 1
+            names.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+        schema = pa.schema([(name, field.type) for name, field in zip(names, schema)])
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for batch in reader:
+                writer.write_batch(pa.RecordBatch.from_arrays(batch.columns, schema=schema))
+                rows += batch.num_rows
+                if os.path.getsize(path) > max_bytes:
+                    raise ExportTooLarge(f"The export is larger than {max_bytes // (1024 * 1024)} MB.")
+    return rows
+
+
+def table_to_frame(table):
+    return table.to_pandas(types_mapper=PANDAS_DTYPES.get, date_as_object=False)
+
+
+def frame_from_cursor(cur):
+    return table_to_frame(fetch_table(cur))
@@ -1,49 +1,19 @@
 import streamlit as st
-import pandas as pd
 import sqlparse
-import psycopg2
-from urllib.parse import urlparse
-
-# PostgreSQL Database connection using Streamlit secrets
-def create_connection():
-    try:
-        # Retrieve the database URL from Streamlit secrets
-        url = st.secrets["postgresql"]["DB_URL"]
-        
-        # Parse the URL to extract connection parameters
-        parsed_url = urlparse(url)
-        
-        # Connect to the PostgreSQL database
-        conn = psycopg2.connect(
-            host=parsed_url.hostname,
-            database=parsed_url.path[1:],  # Remove leading '/'
-            user=parsed_url.username,
-            password=parsed_url.password,
-            port=parsed_url.port
-        )
-        return conn
-    except Exception as e:
-        st.error(f"Error connecting to the database: {e}")
-        return None
-
-
-# Function to execute SQL query and return result as DataFrame
-def execute_sql_query(query):
-    conn = create_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            cur.execute(query)
-            columns = [desc[0] for desc in cur.description]  # Get column names
-            result = cur.fetchall()  # Fetch all rows
-            cur.close()
-            conn.close()
-            return pd.DataFrame(result, columns=columns)  # Return result as DataFrame
-        except Exception as e:
-            st.error(f"Error running query: {e}")
-            return None
-    else:
-        return None
+import time
+from streamlit_ace import st_ace
+from db_utils import get_session_id, PROGRESS_INTERVAL_SECONDS
+from query_router import run_user_query, submit_user_query, run_user_script
+from scratch import get_scratch_info, drop_scratch_schema, load_csv_into_scratch, sql_identifier, scratch_stats, MAX_UPLOAD_BYTES
+from index_advisor import advise_indexes
+from result_cache import get_result_cache
+from result_store import store_result, load_result, get_result_store
+from result_viewer import open_result_viewer, close_result_viewer, is_viewer_open, render_result_viewer, render_frame_pages
+from sql_utils import classify_statement, is_read_only_query, READ
+from exports import export_query, EXPORT_FORMATS, EXPORT_TTL_SECONDS
+from admission import get_admission_controller
+from schema_catalog import check_query, get_session_catalog, render_schema_docs
+from completion import render_suggestions
 
 # Title and Introduction
 st.title("SQL Sandbox 🌌")
@@ -58,6 +28,8 @@ st.write("""
     Experiment with queries to retrieve, filter, and manipulate data across the tables in our galactic dataset. 
     There's no wrong answer—just learning and exploring!
     
+    You can also `INSERT`, `UPDATE`, `DELETE` and create tables: your first change gives you a private copy of the tables, so nothing you do affects other astronauts.
+    
     Example queries to get you started:
     - `SELECT * FROM planets;`
     - `SELECT mission_name, crew_size FROM missions WHERE crew_size > 3;`
@@ -65,24 +37,180 @@ st.write("""
 """)
 
 # Input section for user SQL query
-user_query = st.text_area("Enter your SQL query below:", value="SELECT * FROM planets LIMIT 5;", height=150)
+st.write("Enter your SQL query below:")
+user_query = st_ace(
+    value="SELECT * FROM planets LIMIT 5;",
+    language="sql",
+    theme="cobalt",
+    min_lines=6,
+    key="sandbox_editor",
+    auto_update=True
+)
+render_suggestions(user_query)
+
+script_mode = st.checkbox(
+    "Script mode: run several statements, separated by semicolons, in one transaction",
+    key="sandbox_script_mode"
+)
 
 # Execute button
 if st.button("Execute Query"):
-    # Normalize user's SQL query
-    normalized_user_query = sqlparse.format(user_query, reindent=True, keyword_case='upper').strip()
-    
+    # Mistakes the cached schema catalog can spot are reported without a database
+    # round trip. Scripts may create the tables they query, so they aren't checked.
+    problems = [] if script_mode else check_query(user_query)
+    if script_mode:
+        close_result_viewer("sandbox")
+        st.session_state.sandbox_query = None
+        results, error = run_user_script(user_query)
+        # Result sets go to the result store; only the small summaries stay in session state
+        summaries = []
+        for index, statement in enumerate(results):
+            if statement["result"] is not None:
+                store_result(f"sandbox_script_{index}", statement["result"])
+            summaries.append({key: value for key, value in statement.items() if key != "result"})
+        st.session_state.sandbox_script = {"statements": summaries, "error": error}
+    elif problems:
+        for problem in problems:
+            st.error(problem)
+    else:
+        st.session_state.pop("sandbox_script", None)
+        # Normalize user's SQL query
+        normalized_user_query = sqlparse.format(user_query, reindent=True, keyword_case='upper').strip()
+
+        if classify_statement(normalized_user_query)[0] == READ and is_read_only_query(normalized_user_query):
+            # Reads are browsed a page at a time, each page served from the shared cache
+            st.session_state.sandbox_query = None
+            open_result_viewer("sandbox", normalized_user_query)
+        else:
+            # Everything else runs in the background; writes run in scratch
+            close_result_viewer("sandbox")
+            st.session_state.sandbox_query = submit_user_query(normalized_user_query)
+
+        # Remember the query so the index advisor can analyze it on a later rerun
+        st.session_state.last_sandbox_query = normalized_user_query
+
+# Results of the last script, statement by statement
+script = st.session_state.get("sandbox_script")
+if script is not None:
+    for index, statement in enumerate(script["statements"]):
+        st.markdown(f"**Statement {index + 1}** · `{statement['status']}` · {statement['elapsed_ms']:.1f} ms")
+        st.code(statement["statement"], language="sql")
+        result = load_result(f"sandbox_script_{index}")
+        if result is not None:
+            render_frame_pages(result, f"sandbox_script_{index}")
+    if script["error"]:
+        st.error(script["error"])
+    elif script["statements"]:
+        total_ms = sum(statement["elapsed_ms"] for statement in script["statements"])
+        st.success(f"Ran {len(script['statements'])} statements in one transaction ({total_ms:.1f} ms).")
+
+# Progress and results of the last executed query
+handle = st.session_state.get("sandbox_query")
+loading = False
+if is_viewer_open("sandbox"):
     # Display the normalized query for clarity
-    st.write(f"Your query: \n```sql\n{normalized_user_query}\n```")
-    
-    # Execute the user's query
-    query_result = execute_sql_query(normalized_user_query)  # Execute the query
-    
-    # If there are results, display them in a table
-    if query_result is not None and not query_result.empty:
-        st.write(query_result)  # This displays the DataFrame as a nicely formatted table
+    st.write(f"Your query: \n```sql\n{st.session_state.last_sandbox_query}\n```")
+    loading = render_result_viewer("sandbox")
+
+    # Download the full result, written to disk by a worker and served as a static file
+    with st.expander("📥 Download Results"):
+        file_format = st.radio("Format", EXPORT_FORMATS, format_func=str.upper, horizontal=True)
+        if st.button("Prepare Download"):
+            try:
+                with st.spinner("Exporting..."):
+                    export = export_query(st.session_state.last_sandbox_query, file_format)
+                st.markdown(
+                    f"<a href='{export['url']}' download='results.{file_format}'>⬇️ Download results.{file_format}</a> "
+                    f"({export['rows']:,} rows, {export['bytes'] / 1024:.0f} KiB, "
+                    f"available for {EXPORT_TTL_SECONDS // 60} minutes)",
+                    unsafe_allow_html=True
+                )
+            except Exception as e:
+                st.error(f"Error exporting results: {e}")
+elif handle is not None:
+    # Display the normalized query for clarity
+    st.write(f"Your query: \n```sql\n{handle.query}\n```")
+
+    if not handle.done():
+        st.info(f"⏳ {handle.describe_progress()}")
+        if st.button("Cancel Query"):
+            handle.cancel()
+    elif handle.status == "cancelled":
+        st.warning(f"Query cancelled after {handle.elapsed:.1f} s.")
+    elif handle.error:
+        st.error(f"Error executing query: {handle.error}")
     else:
-        st.write("Query executed but returned no results.")
+        # Hand the rows over to the result store so the handle doesn't pin them
+        if handle.result is not None:
+            store_result("sandbox_result", handle.result)
+            handle.result = None
+        query_result = load_result("sandbox_result")
+        # If there are results, display them in a table
+        if query_result is None:
+            st.write("This result has expired. Run the query again to see it.")
+        elif not query_result.empty:
+            render_frame_pages(query_result, "sandbox_result")  # One page at a time
+        else:
+            st.write("Query executed but returned no results.")
+
+# Scratch area status and reset
+scratch = get_scratch_info(get_session_id())
+if scratch:
+    st.caption(
+        f"You're working in your own copy of the tables ({scratch['bytes'] / 1024:.0f} KiB, "
+        f"created in {scratch['clone_ms']:.0f} ms)."
+    )
+    if st.button("Reset My Tables"):
+        drop_scratch_schema(get_session_id())
+        st.experimental_rerun()
+
+# Load a CSV into a new table in the learner's own copy of the tables
+with st.expander("📤 Upload Your Own Data"):
+    st.write(
+        f"Upload a CSV file with a header row (up to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB). "
+        "It becomes a table in your private copy that you can query like the others."
+    )
+    uploaded_file = st.file_uploader("CSV file", type="csv")
+    if uploaded_file is not None:
+        table_name = st.text_input("Table name", value=sql_identifier(uploaded_file.name.rsplit(".", 1)[0], "upload"))
+        if st.button("Load Into My Tables"):
+            progress_bar = st.progress(0.0)
+            status = st.empty()
+            start = time.perf_counter()
+            last_update = [0.0]
+
+            def on_progress(bytes_read, lines_read):
+                # A few updates a second is plenty
+                if time.perf_counter() - last_update[0] < PROGRESS_INTERVAL_SECONDS:
+                    return
+                last_update[0] = time.perf_counter()
+                elapsed = max(time.perf_counter() - start, 1e-6)
+                progress_bar.progress(min(bytes_read / max(uploaded_file.size, 1), 1.0))
+                status.caption(f"{lines_read:,} rows loaded · {lines_read / elapsed:,.0f} rows/s")
+
+            try:
+                upload = load_csv_into_scratch(uploaded_file, table_name, get_session_id(), on_progress=on_progress)
+                progress_bar.progress(1.0)
+                status.empty()
+                st.success(
+                    f"Loaded {upload['rows']:,} rows into `{upload['table']}` in {upload['seconds']:.1f} s "
+                    f"({upload['rows'] / max(upload['seconds'], 1e-6):,.0f} rows/s)."
+                )
+                st.write("Columns: " + ", ".join(f"`{name}` {sql_type}" for name, sql_type in upload["columns"]))
+            except Exception as e:
+                status.empty()
+                st.error(f"Error loading file: {e}")
+
+# Index advisor for the last executed query
+if st.session_state.get("last_sandbox_query"):
+    with st.expander("🔭 Index Advisor"):
+        st.write("Suggests indexes that could speed up your last query, estimated by re-planning it with hypothetical indexes.")
+        if st.button("Suggest Indexes"):
+            advice = advise_indexes(st.session_state.last_sandbox_query)
+            if advice is not None and advice.empty:
+                st.write("No index candidates found for this query.")
+            elif advice is not None:
+                st.dataframe(advice)
 
 # Display the tables from the database
 
@@ -92,8 +220,8 @@ st.title('Data from the Tables')
 st.subheader('🌍 Planets Table')
 st.write("This table contains detailed information about planets, including their distance from the sun, discoverers, and unique IDs.")
 planets_query = "SELECT * FROM planets;"  # Query the planets table from PostgreSQL
-planets_df = execute_sql_query(planets_query)
-if planets_df is not None:
+planets_df = run_user_query(planets_query)
+if planets_df is not None and not planets_df.empty:
     st.write(planets_df)
 else:
     st.write("No data available or error fetching planets table.")
@@ -102,8 +230,8 @@ else:
 st.subheader('🚀 Missions Table')
 st.write("This table contains the details of various space missions, including their destination planets and crew sizes.")
 missions_query = "SELECT * FROM missions;"  # Query the missions table from PostgreSQL
-missions_df = execute_sql_query(missions_query)
-if missions_df is not None:
+missions_df = run_user_query(missions_query)
+if missions_df is not None and not missions_df.empty:
     st.write(missions_df)
 else:
     st.write("No data available or error fetching missions table.")
@@ -112,47 +240,45 @@ else:
 st.subheader('🌕 Moons Table')
 st.write("This table tracks all the moons, their diameters, discoverers, and the planets they orbit.")
 moons_query = "SELECT * FROM moons;"  # Query the moons table from PostgreSQL
-moons_df = execute_sql_query(moons_query)
-if moons_df is not None:
+moons_df = run_user_query(moons_query)
+if moons_df is not None and not moons_df.empty:
     st.write(moons_df)
 else:
     st.write("No data available or error fetching moons table.")
 
-# Schema Information for reference
+# Schema Information for reference, introspected from the database
 st.subheader("Schema Information")
+try:
+    render_schema_docs(get_session_catalog(), icons={"planets": "🌍", "missions": "🚀", "moons": "🌕"})
+except Exception as e:
+    st.write(f"Schema information is unavailable right now: {e}")
 
-# Planets Table Schema
-st.subheader('🌍 Planets Table Schema')
-st.write("""
-- `planet_id`: INT  
-- `planet_name`: VARCHAR  
-- `distance_from_earth`: INT  
-- `discoverer`: VARCHAR  
-- `discovery_year`: INT  
-- `moons`: INT  
-- `has_rings`: BOOLEAN
-""")
-
-# Missions Table Schema
-st.subheader('🚀 Missions Table Schema')
-st.write("""
-- `mission_id`: INT  
-- `planet_id`: INT (references `planets.planet_id`)  
-- `mission_name`: VARCHAR  
-- `mission_date`: DATE  
-- `crew_size`: INT
-""")
-
-# Moons Table Schema
-st.subheader('🌕 Moons Table Schema')
-st.write("""
-- `moon_id`: INT  
-- `moon_name`: VARCHAR  
-- `planet_id`: INT (references `planets.planet_id`)  
-- `diameter_km`: DECIMAL  
-- `discovered_by`: VARCHAR  
-- `discovery_year`: INT
-""")
+# Shared result cache statistics
+cache_stats = get_result_cache().stats()
+st.sidebar.caption(
+    f"Result cache: {cache_stats['hit_rate']:.0%} hit rate "
+    f"({cache_stats['hits']} hits, {cache_stats['entries']} results, {cache_stats['bytes'] / 1024:.0f} KiB)"
+)
+store_stats = get_result_store().stats()
+st.sidebar.caption(
+    f"Stored results: {store_stats['results']} ({store_stats['inline_bytes'] / 1024:.0f} KiB in memory, "
+    f"{store_stats['spill_bytes'] / 1024:.0f} KiB spilled to disk)"
+)
+scratch_totals = scratch_stats()
+st.sidebar.caption(
+    f"Scratch copies: {scratch_totals['schemas']} ({scratch_totals['total_bytes'] / (1024 * 1024):.1f} MB), "
+    f"cloned in {scratch_totals['avg_clone_ms']:.0f} ms on average"
+)
+admission_stats = get_admission_controller().stats()
+st.sidebar.caption(
+    f"Database queue: {admission_stats['in_flight']}/{admission_stats['limit']} running, "
+    f"{admission_stats['waiting']} waiting, p95 wait {admission_stats['p95_wait_ms']:.0f} ms"
+)
 
 # Footer message
 st.write("Have fun practicing SQL and exploring the galaxy of data!")
+
+# While the query runs, check back shortly; the page stays usable meanwhile
+if loading or (handle is not None and not handle.done()):
+    time.sleep(PROGRESS_INTERVAL_SECONDS)
+    st.experimental_rerun()
@@ -0,0 +1,79 @@
+import streamlit as st
+from stage_utils import init_session_state, level_progress, update_progress, render_stage
+from classroom import render_classroom_join
+from levels import LEVELS
+from reference_tables import render_reference_tables
+
+# Initialize session state to track correctness, stages, and progress
+init_session_state()
+
+# Custom CSS for styling
+st.markdown(
+    """
+    <style>
+    .title {
+        font-size: 24px;
+        color: #2E86C1;
+    }
+    </style>
+    """,
+    unsafe_allow_html=True
+)
+
+# Level description used by the shared stage renderer
+LEVEL = LEVELS["quasar"]
+
+def main():
+    # Title and Introduction
+    st.title('QUASAR ⚡')
+
+    st.image("images/galaxy_about.png", use_column_width=True)
+
+    # Brief description/intro explaining the five stages and rules
+    st.markdown("""
+    ### The Quasar!
+    Beyond the Hercules Supercluster burns the Quasar, where the archives hold millions of records. Correct answers are no longer enough: every query has a time budget, and slow plans burn through your fuel.
+
+    **Stages**:
+    1. **A Decade of Launches**: Count recent missions per planet.
+    2. **Latest Transmissions**: Find the ten newest missions.
+    3. **Crewed Giants**: Find planets that hosted large crews.
+    4. **Colossal Moons**: Chart planets with giant moons.
+    5. **The Busiest World**: Find the planet with the most missions.
+
+    **Rules**:
+    - Your result must match the expected rows, in any order.
+    - Your query must finish within the stage's time budget. Queries running far past it are cancelled.
+    - After every attempt you'll see the time taken, the plan cost and the shape of the plan.
+
+    Every millisecond counts, astronaut!
+    """)
+
+    # Input for user's name
+    st.session_state.user_name = st.text_input("Enter your astronaut's name:")
+    render_classroom_join()
+
+    # This level's progress, restored from earlier visits under the same name
+    progress = level_progress(LEVEL)
+    update_progress(progress["stages_completed"])
+
+    if st.session_state.user_name:
+        # Ensure stages are accessed sequentially
+        current_stage = progress["current_stage"]
+
+        # Create tabs for stages
+        stages = [f"Stage {i+1}" for i in range(5)]
+        tabs = st.tabs(stages)
+
+        for i in range(5):
+            with tabs[i]:
+                if i <= current_stage:
+                    render_stage(LEVEL, i)
+                else:
+                    st.write("You need to complete the previous stages to access this stage.")
+
+    # Reference tables, once per page
+    render_reference_tables("galaxy_scaled", summary=True)
+
+if __name__ == "__main__":
+    main()
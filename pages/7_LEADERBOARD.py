@@ -0,0 +1,55 @@
+import math
+import pandas as pd
+import streamlit as st
+from leaderboard import get_leaderboard, BOARDS, TOP_ROWS, TOP_TTL_SECONDS
+from levels import LEVELS
+
+# Title and Introduction
+st.title("Leaderboard 🏆")
+st.write("""
+    The best astronauts in the galaxy, across every learner. Rankings count graded attempts,
+    so queries caught before they were sent don't cost you anything.
+""")
+
+leaderboard = get_leaderboard()
+
+
+# Show a board: the top from memory, deeper pages straight from the index
+def render_board(board, level=None):
+    key = f"leaderboard_{board}_{level}_page"
+    page = st.session_state.get(key, 1)
+    if page == 1:
+        rows, total = leaderboard.top(board, level)
+    else:
+        rows, total = leaderboard.page(board, level, offset=(page - 1) * TOP_ROWS, limit=TOP_ROWS)
+    if total == 0:
+        st.write("No one has made it onto this board yet. Be the first!")
+        return
+
+    frame = pd.DataFrame(rows, columns=BOARDS[board][0])
+    if "Seconds" in frame:
+        frame["Seconds"] = frame["Seconds"].round(1)
+    frame.index = range((page - 1) * TOP_ROWS + 1, (page - 1) * TOP_ROWS + len(frame) + 1)
+    st.table(frame)
+
+    pages = math.ceil(total / TOP_ROWS)
+    if pages > 1:
+        st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=key)
+    st.caption(f"{total:,} astronauts ranked · the top {TOP_ROWS} refresh every {TOP_TTL_SECONDS} s")
+
+
+fastest_tab, attempts_tab, solved_tab = st.tabs(["⚡ Fastest Completions", "🎯 Fewest Attempts", "🌟 Most Stages Solved"])
+
+with fastest_tab:
+    st.write("Time from a level's first graded attempt to its last stage solved.")
+    level = st.selectbox("Level", list(LEVELS), format_func=lambda key: LEVELS[key]["title"], key="leaderboard_fastest_level")
+    render_board("fastest", level)
+
+with attempts_tab:
+    st.write("Graded attempts needed to complete a level.")
+    level = st.selectbox("Level", list(LEVELS), format_func=lambda key: LEVELS[key]["title"], key="leaderboard_attempts_level")
+    render_board("fewest_attempts", level)
+
+with solved_tab:
+    st.write("Stages solved across every level.")
+    render_board("most_solved")
@@ -0,0 +1,85 @@
+import streamlit as st
+from analytics import load_events, stage_funnel, common_wrong_answers, get_event_buffer
+from verdict_memo import get_verdict_memo
+from result_cache import get_dataset_version, bump_dataset_version, get_result_cache
+
+# Title and Introduction
+st.title("Instructor View 🧑‍🚀")
+st.write("""
+    How learners move through each level: who reaches a stage, how many attempts and how long
+    it takes them to solve it, how often they need hints, and the wrong answers they share.
+""")
+
+# Optional [instructor] PASSWORD secret keeps the page to instructors
+password = st.secrets.get("instructor", {}).get("PASSWORD")
+if password and st.text_input("Instructor password", type="password") != password:
+    st.stop()
+
+# After the galaxy tables are reloaded (db/init.sql, db/scaled.sql), results,
+# catalogs and verdicts cached for the old data must go, in every app process
+with st.expander("Reloaded the galaxy tables?"):
+    st.write(f"Cached results are for dataset version `{get_dataset_version()}`.")
+    if st.button("Refresh cached data"):
+        bump_dataset_version()
+        get_result_cache().clear()
+        st.success(f"Now on dataset version `{get_dataset_version()}`; every app process picks it up within seconds.")
+
+events = load_events()
+buffer = get_event_buffer().stats()
+st.caption(
+    f"{len(events):,} events on disk · this process: {buffer['buffered']:,} waiting to be written, "
+    f"{buffer['dropped']:,} dropped"
+)
+if events.empty:
+    st.write("No learner activity recorded yet.")
+    st.stop()
+
+levels = sorted(events["level"].dropna().unique())
+level = st.selectbox("Level", ["All levels"] + levels)
+if level != "All levels":
+    events = events[events["level"] == level]
+
+st.markdown("### Stage Funnel")
+funnel = stage_funnel(events)
+if not funnel.empty:
+    funnel["hint_rate"] = (funnel["hint_rate"] * 100).round(1)
+    funnel["median_seconds_to_solve"] = funnel["median_seconds_to_solve"].round(0)
+    funnel = funnel.rename(columns={
+        "level": "Level",
+        "stage": "Stage",
+        "viewed": "Viewed",
+        "attempted": "Attempted",
+        "solved": "Solved",
+        "median_attempts_to_solve": "Median Attempts to Solve",
+        "median_seconds_to_solve": "Median Seconds to Solve",
+        "used_hints": "Used Hints",
+        "hint_rate": "Hint Rate %",
+    })
+    st.dataframe(funnel, use_container_width=True)
+
+st.markdown("### Common Wrong Answers")
+wrong = common_wrong_answers(events, limit=st.slider("Show", 5, 50, 10))
+if wrong.empty:
+    st.write("No wrong answers recorded yet.")
+else:
+    for _, row in wrong.iterrows():
+        st.markdown(
+            f"**{row['level']} · Stage {row['stage']}**: {row['submissions']} submissions "
+            f"from {row['learners']} learners"
+        )
+        st.code(row["example"], language="sql")
+
+st.markdown("### Answered From Memory")
+memo = get_verdict_memo()
+memo_stats = memo.stats()
+st.caption(
+    f"This process remembers {memo_stats['entries']:,} verdicts · "
+    f"{memo_stats['hits']:,} submissions answered without grading ({memo_stats['hit_rate']:.0%}), "
+    f"{memo_stats['shared']:,} more shared a verdict being graded"
+)
+repeated = [row for row in memo.top_wrong() if row[3] and (level == "All levels" or row[0] == level)]
+if not repeated:
+    st.write("No wrong answer has been repeated yet.")
+for memo_level, stage, fingerprint, hits, example in repeated:
+    st.markdown(f"**{memo_level} · Stage {stage}** (`{fingerprint}`): repeated {hits} times")
+    st.code(example, language="sql")
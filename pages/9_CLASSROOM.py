@@ -0,0 +1,92 @@
+import time
+import pandas as pd
+import streamlit as st
+from classroom import get_classroom
+from levels import LEVELS
+
+# Seconds between checks for new counters while the dashboard is live
+LIVE_REFRESH_SECONDS = 2
+
+# Title and Introduction
+st.title("Classroom 🏫")
+st.write("""
+    Open a room for your workshop and share its code: learners enter it in the sidebar of the
+    level pages. The dashboard follows how far the room has got, stage by stage.
+""")
+
+# Optional [instructor] PASSWORD secret keeps the page to instructors
+password = st.secrets.get("instructor", {}).get("PASSWORD")
+if password and st.text_input("Instructor password", type="password") != password:
+    st.stop()
+
+classroom = get_classroom()
+
+with st.expander("Open a new room"):
+    room_name = st.text_input("Room name", value="SQL Galaxy workshop")
+    if st.button("Open room"):
+        st.session_state.classroom_dashboard = {"code": classroom.open_room(room_name), "seq": 0, "stages": {}}
+
+rooms = classroom.open_rooms()
+dashboard = st.session_state.get("classroom_dashboard")
+codes = [room["code"] for room in rooms]
+if dashboard and dashboard["code"] not in codes:
+    codes.insert(0, dashboard["code"])
+if not codes:
+    st.write("No rooms are open.")
+    st.stop()
+
+names = {room["code"]: room["name"] for room in rooms}
+code = st.selectbox(
+    "Room", codes, format_func=lambda code: f"{code} · {names[code]}" if code in names else code,
+    index=codes.index(dashboard["code"]) if dashboard else 0
+)
+# The counters seen so far; only rows changed since are fetched
+if dashboard is None or dashboard["code"] != code:
+    dashboard = st.session_state.classroom_dashboard = {"code": code, "seq": 0, "stages": {}}
+
+
+def refresh():
+    room, rows, seq = classroom.changes(code, dashboard["seq"])
+    for level, stage, attempts, solved in rows:
+        dashboard["stages"][(level, stage)] = (attempts, solved)
+    changed = bool(rows) or seq != dashboard["seq"] or room != dashboard.get("room")
+    dashboard["seq"] = seq
+    dashboard["room"] = room
+    return changed
+
+def render(placeholder):
+    room = dashboard["room"]
+    with placeholder.container():
+        st.markdown(f"## Room `{room['code']}`: {room['name']}")
+        st.metric("Learners joined", room["members"])
+        if not room["open"]:
+            st.warning("This room is closed.")
+        if not dashboard["stages"]:
+            st.write("No graded attempts yet.")
+        for level, definition in LEVELS.items():
+            stages = sorted((stage, counts) for (key, stage), counts in dashboard["stages"].items() if key == level)
+            if not stages:
+                continue
+            st.markdown(f"### {definition['title']}")
+            frame = pd.DataFrame(
+                [(f"Stage {stage}", solved, attempts) for stage, (attempts, solved) in stages],
+                columns=["Stage", "Solved", "Attempts"]
+            ).set_index("Stage")
+            frame["Completion %"] = (frame["Solved"] / max(room["members"], 1) * 100).round(0)
+            st.dataframe(frame, use_container_width=True)
+
+
+refresh()
+if dashboard["room"]["open"] and st.button(f"Close room {code}"):
+    classroom.close_room(code)
+    refresh()
+
+placeholder = st.empty()
+render(placeholder)
+
+# Check back shortly for new counters; each rerun fetches only what changed,
+# and the page stays usable meanwhile
+if st.checkbox("Live updates", value=True):
+    st.caption(f"Checking for new attempts every {LIVE_REFRESH_SECONDS} s")
+    time.sleep(LIVE_REFRESH_SECONDS)
+    st.experimental_rerun()
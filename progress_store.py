@@ -0,0 +1,79 @@
+import json
+import time
+import streamlit as st
+from state_backend import WriteBehindStore, get_state_backend
+
+# Learner progress that survives reloads and restarts. Progress is keyed by
+# learner and level. Saves go into a write-behind queue: the page never waits
+# on the disk, repeated saves of the same (learner, level) before a flush
+# coalesce into one row, and a background thread writes each batch in a
+# single transaction. Loads read the pending queue, then the state backend
+# (see state_backend.py), which every app process shares; each session then
+# keeps what it loaded in its session state.
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS learner_progress (
+    learner TEXT NOT NULL,
+    level TEXT NOT NULL,
+    answers TEXT NOT NULL,
+    current_stage INTEGER NOT NULL,
+    stages_completed INTEGER NOT NULL,
+    updated_at {real} NOT NULL,
+    PRIMARY KEY (learner, level)
+)
+"""
+
+UPSERT_SQL = """
+INSERT INTO learner_progress (learner, level, answers, current_stage, stages_completed, updated_at)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (learner, level) DO UPDATE SET
+    answers = excluded.answers,
+    current_stage = excluded.current_stage,
+    stages_completed = excluded.stages_completed,
+    updated_at = excluded.updated_at
+"""
+
+
+# Learners are identified by the name they enter, case and spacing aside
+def learner_id(name):
+    return " ".join((name or "").split()).lower() or None
+
+
+class ProgressStore(WriteBehindStore):
+    SCHEMA = [SCHEMA_SQL]
+
+    # Not cached in memory: another process may have saved since
+    def load(self, learner, level):
+        key = (learner, level)
+        with self._lock:
+            if key in self._pending:
+                return dict(self._pending[key])
+        rows = self._read(
+            "SELECT answers, current_stage, stages_completed FROM learner_progress WHERE learner = ? AND level = ?",
+            key
+        )
+        if not rows:
+            return None
+        answers, current_stage, stages_completed = rows[0]
+        return {"answers": json.loads(answers), "current_stage": current_stage, "stages_completed": stages_completed}
+
+    # Queue a save; returns at once
+    def save(self, learner, level, progress):
+        self._queue((learner, level), {
+            "answers": list(progress["answers"]),
+            "current_stage": progress["current_stage"],
+            "stages_completed": progress["stages_completed"],
+        })
+
+    def _write(self, cur, sql, batch):
+        now = time.time()
+        cur.executemany(sql(UPSERT_SQL), [
+            (learner, level, json.dumps(p["answers"]), p["current_stage"], p["stages_completed"], now)
+            for (learner, level), p in batch.items()
+        ])
+
+
+# One store per server process
+@st.cache_resource
+def get_progress_store():
+    return ProgressStore(get_state_backend())
@@ -0,0 +1,71 @@
+import streamlit as st
+import pandas as pd
+from db_utils import execute_cached_query, get_session_id, submit_read_query, execute_read_script, ScriptError
+from query_workers import QueryHandle
+from result_cache import get_result_cache, result_cache_key
+from scratch import get_scratch_info, execute_in_scratch, execute_script_in_scratch, scratch_schema_name
+from sql_utils import classify_statement, classify_script, split_sql_script, is_read_only_query, READ, REJECTED, WRITE
+
+# Entry point for user SQL. Reads take the pooled, cached read path, writes go
+# to the session's scratch schema, and anything dangerous is refused before it
+# reaches the database. Once a session has written, its reads are answered
+# from its own scratch copy so it sees its changes.
+def run_user_query(query):
+    session_id = get_session_id()
+    kind, reason = classify_statement(query, scratch_schema_name(session_id))
+    if kind == REJECTED:
+        st.error(f"Query rejected: {reason}")
+        return pd.DataFrame()
+
+    if kind == WRITE:
+        return execute_in_scratch(query, session_id)
+
+    scratch = get_scratch_info(session_id)
+    if scratch is None:
+        return execute_cached_query(query)
+    return execute_cached_query(
+        query,
+        search_path=f"{scratch['schema']}@{scratch['version']}",
+        execute=lambda q: execute_in_scratch(q, session_id, write=False)
+    )
+
+# Background variant of run_user_query that returns a QueryHandle. Shared
+# reads run asynchronously and can be cancelled; cache hits, writes and
+# scratch reads are quick and come back as already finished handles.
+def submit_user_query(query):
+    kind, _ = classify_statement(query, scratch_schema_name(get_session_id()))
+    if kind != READ or not is_read_only_query(query) or get_scratch_info(get_session_id()) is not None:
+        return QueryHandle.finished(query, run_user_query(query))
+
+    cache = get_result_cache()
+    key = result_cache_key(query)
+    result = cache.get(key)
+    if result is not None:
+        return QueryHandle.finished(query, result)
+
+    def remember(result):
+        # Only real results are cached, as in execute_cached_query
+        if not result.empty:
+            cache.put(key, result)
+    return submit_read_query(query, on_result=remember)
+
+# Run a multi-statement script in one transaction over one connection.
+# Scripts that write run in the session's scratch schema, read-only ones
+# wherever the session's reads go. Returns (per-statement results, error);
+# on an error nothing the script did is kept.
+def run_user_script(script):
+    session_id = get_session_id()
+    statements = split_sql_script(script)
+    kind, reason = classify_script(statements, scratch_schema_name(session_id))
+    if kind == REJECTED:
+        return [], f"Script rejected: {reason}"
+
+    scratch = get_scratch_info(session_id)
+    try:
+        if kind == WRITE:
+            return execute_script_in_scratch(statements, session_id), None
+        return execute_read_script(statements, search_path=scratch["schema"] if scratch else None), None
+    except ScriptError as e:
+        return e.results, f"{e} (the script was rolled back)"
+    except Exception as e:
+        return [], str(e)
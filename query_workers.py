@@ -0,0 +1,371 @@
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import threading
+import time
+import psycopg2
+import psycopg2.extras
+import pyarrow as pa
+from materialize import (
+    copy_to_table, copy_to_csv_file, copy_to_parquet_file, fetch_table, register_fast_types, table_to_frame
+)
+from grading import answer_matches
+
+# Out-of-process execution of user SQL. Each worker owns one database
+# connection, runs a job (a query, an export or an answer check), and sends query results
+# back as a compressed Arrow IPC buffer. A job that overruns its timeout gets
+# its worker killed and replaced, so one pathological submission can never
+# stall the Streamlit process. This module deliberately doesn't import
+# Streamlit: workers are spawned fresh and only need the database driver.
+
+# Address space a worker may use for results before it fails with MemoryError
+WORKER_MEMORY_LIMIT_BYTES = 512 * 1024 * 1024
+# Extra time a worker gets past the statement timeout before it is killed
+KILL_GRACE_SECONDS = 2
+# Timeout for answer checks
+GRADE_TIMEOUT_SECONDS = 5
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+class WorkerError(Exception):
+    pass
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+# A query submitted for background execution. The worker pool fills in its
+# progress, the submitter calls finish(), and any thread may cancel() it.
+class QueryHandle:
+    def __init__(self, query):
+        self.query = query
+        self.status = "queued"  # queued, running, done, cancelled or failed
+        self.queue_position = 0
+        self.rows_fetched = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self._worker_pid = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    # A handle that is already done, for results that needed no round trip
+    @classmethod
+    def finished(cls, query, result):
+        handle = cls(query)
+        handle.finish(result=result)
+        return handle
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def set_queued(self, position):
+        self.queue_position = position
+
+    def describe_progress(self):
+        if self.status == "queued":
+            return f"Queued for launch: {self.queue_position} {'query' if self.queue_position == 1 else 'queries'} ahead of yours..."
+        return f"Running for {self.elapsed:.1f} s · {self.rows_fetched:,} rows fetched"
+
+    def finish(self, result=None, error=None, status=None):
+        self.result = result
+        self.error = error
+        self.status = status or ("failed" if error else "done")
+        self.finished_at = time.monotonic()
+        self._done.set()
+
+    def _attach(self, pid):
+        with self._lock:
+            self._worker_pid = pid
+            self.status = "running"
+            cancel = self.cancel_requested
+        if cancel:
+            self.cancel()
+
+    def _detach(self):
+        with self._lock:
+            self._worker_pid = None
+
+    # Ask the worker to cancel the statement. It calls conn.cancel(), so the
+    # database stops the query and the worker stays usable.
+    def cancel(self):
+        with self._lock:
+            self.cancel_requested = True
+            if self._worker_pid is not None:
+                os.kill(self._worker_pid, signal.SIGINT)
+
+
+# Arrow table -> IPC bytes, compressed for the trip back over the pipe
+def table_to_arrow_bytes(table):
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="lz4")
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def arrow_bytes_to_frame(buffer):
+    return table_to_frame(pa.ipc.open_stream(buffer).read_all())
+
+
+# Connection of the running job, and whether the parent asked to cancel it
+_active_conn = None
+_interrupted = False
+
+# SIGINT from QueryHandle.cancel(): cancel the statement in flight. Queries
+# run with wait_select as the wait callback, so this runs mid-query.
+def _on_interrupt(signum, frame):
+    global _interrupted
+    _interrupted = True
+    if _active_conn is not None:
+        _active_conn.cancel()
+
+# Bulk mode: COPY the result out and decode it into Arrow, reporting the row
+# count after each record batch. Falls back to the cursor if a value doesn't
+# fit its column type.
+def _fetch_bulk(cur, sql, report):
+    def on_batch(fetched):
+        if _interrupted:
+            raise QueryCancelled("Query cancelled.")
+        report({"progress": fetched})
+
+    # COPY isn't supported with a wait callback; the signal handler can still
+    # cancel it, since this thread reads the stream while another one copies
+    psycopg2.extensions.set_wait_callback(None)
+    try:
+        cur.execute("SAVEPOINT bulk")
+        table = copy_to_table(cur, sql, on_batch=on_batch)
+        cur.execute("RELEASE SAVEPOINT bulk")
+    except pa.ArrowInvalid:
+        cur.execute("ROLLBACK TO SAVEPOINT bulk")
+        cur.execute(sql)
+        table = fetch_table(cur, on_batch=on_batch)
+    finally:
+        psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+    return table
+
+def _run_query(conn, job, report):
+    # Per-job settings live in a read-only transaction so they end with it;
+    # plain reads run straight on the autocommit connection. Bulk mode also
+    # needs a transaction for its savepoint.
+    in_transaction = bool(
+        job.get("search_path") or job.get("timeout_ms") or job.get("explain") or job.get("bulk")
+    )
+    cur = conn.cursor()
+    register_fast_types(cur)
+    if in_transaction:
+        cur.execute("BEGIN READ ONLY")
+    try:
+        if job.get("search_path"):
+            cur.execute("SET LOCAL search_path TO %s", (job["search_path"],))
+        if job.get("timeout_ms"):
+            cur.execute("SET LOCAL statement_timeout = %s", (int(job["timeout_ms"]),))
+        plan = None
+        if job.get("explain"):
+            cur.execute("EXPLAIN (FORMAT JSON) " + job["sql"])
+            plan = cur.fetchone()[0][0]["Plan"]
+            if not job.get("execute", True):
+                return {"arrow": None, "elapsed_ms": 0.0, "plan": plan, "status": "EXPLAIN"}
+
+        start = time.perf_counter()
+        if job.get("bulk"):
+            table = _fetch_bulk(cur, job["sql"], report)
+            arrow = table_to_arrow_bytes(table)
+            status = f"SELECT {table.num_rows}"
+        else:
+            cur.execute(job["sql"])
+            arrow = table_to_arrow_bytes(fetch_table(cur)) if cur.description is not None else None
+            status = cur.statusmessage
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return {"arrow": arrow, "elapsed_ms": elapsed_ms, "plan": plan, "status": status}
+    finally:
+        if in_transaction and not conn.closed:
+            cur.execute("ROLLBACK")
+        cur.close()
+
+# Export a query's result to a file with COPY, at constant memory
+def _export(conn, job):
+    cur = conn.cursor()
+    cur.execute("BEGIN READ ONLY")
+    try:
+        if job.get("search_path"):
+            cur.execute("SET LOCAL search_path TO %s", (job["search_path"],))
+        cur.execute("SET LOCAL statement_timeout = %s", (int(job["timeout_ms"]),))
+        export = copy_to_csv_file if job["format"] == "csv" else copy_to_parquet_file
+        psycopg2.extensions.set_wait_callback(None)
+        try:
+            rows = export(cur, job["sql"], job["path"], job["max_bytes"])
+        finally:
+            psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+        return {"rows": rows, "bytes": os.path.getsize(job["path"])}
+    except Exception:
+        if os.path.exists(job["path"]):
+            os.remove(job["path"])
+        raise
+    finally:
+        if not conn.closed:
+            try:
+                cur.execute("ROLLBACK")
+            except psycopg2.Error:
+                # An aborted COPY can leave the connection unusable
+                conn.close()
+
+def _grade(job):
+    return {"correct": answer_matches(job["user_answer"], job["correct_answers"])}
+
+def _worker_main(pipe, connection_params, memory_limit):
+    global _active_conn, _interrupted
+    resource.setrlimit(resource.RLIMIT_DATA, (memory_limit, memory_limit))
+    signal.signal(signal.SIGINT, _on_interrupt)
+    psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+    conn = None
+    while True:
+        try:
+            job = pipe.recv()
+        except EOFError:
+            return
+        _interrupted = False
+        try:
+            if job["kind"] in ("query", "export"):
+                if conn is None or conn.closed:
+                    conn = psycopg2.connect(**connection_params)
+                    conn.set_session(readonly=True, autocommit=True)
+                _active_conn = conn
+                reply = _run_query(conn, job, pipe.send) if job["kind"] == "query" else _export(conn, job)
+            else:
+                reply = _grade(job)
+            reply["ok"] = True
+        except MemoryError:
+            reply = {"ok": False, "error": "The result is too large to load."}
+        except (psycopg2.extensions.QueryCanceledError, QueryCancelled) as e:
+            if _interrupted:
+                reply = {"ok": False, "cancelled": True, "error": "Query cancelled."}
+            else:
+                reply = {"ok": False, "timeout": True, "error": str(e)}
+        except Exception as e:
+            reply = {"ok": False, "error": str(e)}
+        finally:
+            _active_conn = None
+        pipe.send(reply)
+
+
+# Fixed-size pool of worker processes, started lazily and replaced when they
+# are killed or die
+class WorkerPool:
+    def __init__(self, size, connection_params, memory_limit=WORKER_MEMORY_LIMIT_BYTES):
+        self.connection_params = connection_params
+        self.memory_limit = memory_limit
+        self.kills = 0
+        # Spawned, not forked: the Streamlit process is full of threads
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(None)
+
+    def _start_worker(self):
+        parent_end, child_end = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_end, self.connection_params, self.memory_limit),
+            daemon=True
+        )
+        process.start()
+        child_end.close()
+        return process, parent_end
+
+    def _kill(self, worker):
+        process, pipe = worker
+        process.kill()
+        process.join()
+        pipe.close()
+        self.kills += 1
+
+    # Run a job on an idle worker and wait at most timeout seconds for it.
+    # With a handle, progress is recorded on it and it can cancel the job.
+    def run(self, job, timeout, handle=None):
+        worker = self._idle.get()
+        deadline = time.monotonic() + timeout
+        try:
+            if worker is None or not worker[0].is_alive():
+                worker = self._start_worker()
+            process, pipe = worker
+            pipe.send(job)
+            if handle:
+                handle._attach(process.pid)
+            while True:
+                if not pipe.poll(max(deadline - time.monotonic(), 0)):
+                    self._kill(worker)
+                    worker = None
+                    raise QueryTimeout(f"Stopped after {timeout:.0f} seconds.")
+                reply = pipe.recv()
+                if "progress" not in reply:
+                    break
+                if handle:
+                    handle.rows_fetched = reply["progress"]
+        except (EOFError, OSError):
+            self._kill(worker)
+            worker = None
+            raise WorkerError("The query worker stopped unexpectedly. The result may be too large.")
+        finally:
+            if handle:
+                handle._detach()
+            self._idle.put(worker)
+
+        if not reply["ok"]:
+            if reply.get("cancelled"):
+                raise QueryCancelled(reply["error"])
+            if reply.get("timeout"):
+                raise QueryTimeout(reply["error"])
+            raise WorkerError(reply["error"])
+        return reply
+
+    # Run a query and return (DataFrame or None, elapsed ms, plan, status).
+    # With bulk, a read-only SELECT is fetched with COPY and decoded straight
+    # into Arrow; its row count shows up on the handle as it goes. With
+    # explain and execute=False, the query is only planned.
+    def run_query(self, sql, search_path=None, timeout_ms=None, explain=False, default_timeout_ms=10000,
+                  handle=None, bulk=False, execute=True):
+        job = {
+            "kind": "query",
+            "sql": sql,
+            "search_path": search_path,
+            "timeout_ms": timeout_ms,
+            "explain": explain,
+            "bulk": bulk,
+            "execute": execute,
+        }
+        reply = self.run(job, (timeout_ms or default_timeout_ms) / 1000 + KILL_GRACE_SECONDS, handle=handle)
+        frame = arrow_bytes_to_frame(reply["arrow"]) if reply["arrow"] is not None else None
+        return frame, reply["elapsed_ms"], reply["plan"], reply["status"]
+
+    def grade(self, user_answer, correct_answers):
+        job = {"kind": "grade", "user_answer": user_answer, "correct_answers": list(correct_answers)}
+        return self.run(job, GRADE_TIMEOUT_SECONDS)["correct"]
+
+    # Write a query's result to path as "csv" or "parquet"; returns rows and bytes
+    def export(self, sql, path, file_format, max_bytes, timeout_ms, search_path=None):
+        job = {
+            "kind": "export",
+            "sql": sql,
+            "path": path,
+            "format": file_format,
+            "max_bytes": max_bytes,
+            "timeout_ms": timeout_ms,
+            "search_path": search_path,
+        }
+        reply = self.run(job, timeout_ms / 1000 + KILL_GRACE_SECONDS)
+        return {"rows": reply["rows"], "bytes": reply["bytes"]}
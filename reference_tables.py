@@ -0,0 +1,76 @@
+import streamlit as st
+from db_utils import pooled_connection, GALAXY_TABLES
+from materialize import frame_from_cursor, register_fast_types
+from schema_catalog import load_catalog, catalog_key, render_schema_summary
+
+# Reference tables shown on the level pages, read from the live data instead
+# of hand-written markdown. All three tables are fetched over one pooled
+# connection, cached process-wide per dataset version, and rendered once per
+# page. Tables bigger than a preview show a repeatable random sample and
+# their size.
+
+# Rows shown per table; bigger tables are sampled
+PREVIEW_ROWS = 20
+# Seed for TABLESAMPLE, so every rerun shows the same sample
+SAMPLE_SEED = 42
+
+TABLE_ICONS = {"planets": "🌍", "missions": "🚀", "moons": "🌕"}
+
+
+def _reference_query(schema, table, key, rows):
+    if rows is None:
+        # Not analyzed yet, so the size is unknown: the first rows by key
+        return f"SELECT * FROM {schema}.{table} ORDER BY {key} LIMIT {PREVIEW_ROWS}"
+    if rows <= PREVIEW_ROWS:
+        return f"SELECT * FROM {schema}.{table} ORDER BY {key}"
+    # Sample about twice the preview size, then trim, so only the sample is sorted
+    percent = min(100.0, 100.0 * PREVIEW_ROWS * 2 / rows)
+    return (
+        f"SELECT * FROM {schema}.{table} TABLESAMPLE BERNOULLI ({percent:.6f}) REPEATABLE ({SAMPLE_SEED}) "
+        f"ORDER BY {key} LIMIT {PREVIEW_ROWS}"
+    )
+
+# {table: {"frame", "rows", "sampled"}} for the galaxy tables in a schema;
+# rows is None when a big table's size isn't known yet. version is only part
+# of the cache key.
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_reference_tables(schema, version):
+    catalog = load_catalog(schema, version)
+    tables = {}
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        register_fast_types(cur)
+        for table, key in GALAXY_TABLES.items():
+            rows = catalog["tables"].get(table, {}).get("rows")
+            cur.execute(_reference_query(schema, table, key, rows))
+            frame = frame_from_cursor(cur)
+            if rows is None and len(frame) < PREVIEW_ROWS:
+                rows = len(frame)
+            sampled = rows is None or rows > PREVIEW_ROWS
+            tables[table] = {"frame": frame, "rows": rows if sampled else len(frame), "sampled": sampled}
+        cur.close()
+    return tables
+
+
+# Collapsible reference section, rendered once per page. With summary=True
+# the tables' sizes and indexes are listed first.
+def render_reference_tables(schema="public", summary=False):
+    with st.expander("📄 Reference Tables"):
+        st.write("Below are the tables you can use in your queries:")
+        try:
+            key = catalog_key(schema)
+            if summary:
+                render_schema_summary(load_catalog(*key))
+            tables = load_reference_tables(*key)
+        except Exception as e:
+            st.write(f"The reference tables are unavailable right now: {e}")
+            return
+        for table, reference in tables.items():
+            st.markdown(f"### {TABLE_ICONS.get(table, '📄')} `{table}`")
+            st.dataframe(reference["frame"], use_container_width=True)
+            if reference["rows"] is None:
+                st.caption(f"The first {len(reference['frame'])} rows")
+            elif reference["sampled"]:
+                st.caption(f"A sample of {len(reference['frame'])} of about {reference['rows']:,} rows")
+            else:
+                st.caption(f"{reference['rows']:,} rows")
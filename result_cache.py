@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+import streamlit as st
+from sql_utils import fingerprint_sql
+from state_backend import get_state_signals
+
+# Upper bound on the memory held by cached results, in bytes
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+# Results bigger than this share of the budget are never cached
+MAX_ENTRY_SHARE = 0.125
+# Seconds a cached result stays valid
+CACHE_TTL_SECONDS = 300
+
+
+# Process-wide LRU cache of read-only query results with a TTL and a memory
+# budget. Cached DataFrames are shared between sessions and must not be mutated.
+class ResultCache:
+    def __init__(self, max_bytes=MAX_CACHE_BYTES, ttl_seconds=CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, size, frame)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, frame):
+        size = int(frame.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes * MAX_ENTRY_SHARE:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, frame)
+            self.bytes += size
+            # Evict least recently used results until we're back under budget
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# One cache per server process, shared by every session
+@st.cache_resource
+def get_result_cache():
+    return ResultCache()
+
+
+# Version of the data the cached results were computed from. It comes from the
+# optional DATASET_VERSION secret and a "dataset" signal in the shared state
+# backend, bumped whenever the data is reloaded. A bump in any app process
+# invalidates every cached result, catalog and reference table in all of them.
+def get_dataset_version():
+    configured = st.secrets.get("postgresql", {}).get("DATASET_VERSION", "1")
+    return f"{configured}.{get_state_signals().get('dataset')}"
+
+def bump_dataset_version():
+    get_state_signals().bump("dataset")
+
+
+# Cache key: canonical fingerprint of the statement, the schema it runs in and
+# the dataset version
+def result_cache_key(query, search_path=None):
+    return (fingerprint_sql(query), search_path or "public", get_dataset_version())
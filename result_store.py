@@ -0,0 +1,184 @@
+import itertools
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+from streamlit.runtime import Runtime
+from db_utils import get_session_id
+
+# Results each session is looking at (stage answers, the last sandbox query),
+# kept out of st.session_state so their memory is bounded across all sessions.
+# Small results stay in memory; big ones, and whatever no longer fits the
+# memory budget, are spilled to Parquet in a temp directory. Least recently
+# viewed results go first, and a session's results go when it ends. A
+# Streamlit session lives in one process, so its results stay in that
+# process; what must outlive a replica is in the state backend.
+
+# Memory held by in-memory results across every session
+MAX_INLINE_BYTES = 128 * 1024 * 1024
+# Results bigger than this are spilled right away
+SPILL_THRESHOLD_BYTES = 4 * 1024 * 1024
+# Disk used by spilled results; the least recently viewed are deleted beyond it
+MAX_SPILL_BYTES = 2 * 1024 * 1024 * 1024
+# How often results of ended sessions are swept
+STORE_SWEEP_INTERVAL_SECONDS = 60
+
+
+# Process-wide store of per-session results with LRU spill and eviction
+class ResultStore:
+    def __init__(self, max_inline_bytes=MAX_INLINE_BYTES, max_spill_bytes=MAX_SPILL_BYTES):
+        self.max_inline_bytes = max_inline_bytes
+        self.max_spill_bytes = max_spill_bytes
+        self.inline_bytes = 0
+        self.spill_bytes = 0
+        self.spills = 0
+        self.evictions = 0
+        self.directory = tempfile.mkdtemp(prefix="sql_galaxy_results_")
+        self._file_numbers = itertools.count()
+        # (session id, key) -> entry, least recently viewed first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, session_id, key, frame):
+        entry = {"frame": frame, "bytes": int(frame.memory_usage(index=True, deep=True).sum()), "path": None}
+        with self._lock:
+            self._drop((session_id, key))
+            self._entries[(session_id, key)] = entry
+            self.inline_bytes += entry["bytes"]
+            if entry["bytes"] > SPILL_THRESHOLD_BYTES:
+                self._spill((session_id, key))
+            self._enforce_budgets()
+
+    def get(self, session_id, key):
+        with self._lock:
+            entry = self._entries.get((session_id, key))
+            if entry is None:
+                return None
+            self._entries.move_to_end((session_id, key))
+            if entry["frame"] is not None:
+                return entry["frame"]
+            path, columns = entry["path"], entry["columns"]
+        # Spilled results are read back on every view instead of being
+        # pinned in memory again
+        try:
+            frame = pd.read_parquet(path)
+        except FileNotFoundError:
+            # Evicted in the meantime
+            return None
+        frame.columns = columns
+        return frame
+
+    def drop(self, session_id, key):
+        with self._lock:
+            self._drop((session_id, key))
+
+    def drop_session(self, session_id):
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == session_id]:
+                self._drop(entry_key)
+
+    def session_ids(self):
+        with self._lock:
+            return {session_id for session_id, _ in self._entries}
+
+    def _drop(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+        if entry["frame"] is not None:
+            self.inline_bytes -= entry["bytes"]
+        else:
+            self.spill_bytes -= entry["bytes"]
+            if os.path.exists(entry["path"]):
+                os.remove(entry["path"])
+
+    # Write an in-memory result to Parquet and let go of the frame
+    def _spill(self, entry_key):
+        entry = self._entries[entry_key]
+        path = os.path.join(self.directory, f"{next(self._file_numbers)}.parquet")
+        frame = entry["frame"]
+        try:
+            # Parquet needs unique string column names; the real ones are kept aside
+            frame.set_axis([f"c{index}" for index in range(frame.shape[1])], axis=1).to_parquet(
+                path, compression="zstd", index=False
+            )
+        except Exception:
+            # Not representable in Parquet, e.g. mixed-type columns: drop it
+            self._drop(entry_key)
+            self.evictions += 1
+            return
+        self.inline_bytes -= entry["bytes"]
+        entry.update(frame=None, path=path, columns=list(frame.columns), bytes=os.path.getsize(path))
+        self.spill_bytes += entry["bytes"]
+        self.spills += 1
+
+    def _enforce_budgets(self):
+        for entry_key in list(self._entries):
+            if self.inline_bytes <= self.max_inline_bytes:
+                break
+            if self._entries[entry_key]["frame"] is not None:
+                self._spill(entry_key)
+        for entry_key in list(self._entries):
+            if self.spill_bytes <= self.max_spill_bytes:
+                break
+            if self._entries[entry_key]["frame"] is None:
+                self._drop(entry_key)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "results": len(self._entries),
+                "inline_bytes": self.inline_bytes,
+                "spill_bytes": self.spill_bytes,
+                "spills": self.spills,
+                "evictions": self.evictions,
+            }
+
+
+# One store per server process; its spill directory goes with it
+@st.cache_resource
+def get_result_store():
+    store = ResultStore()
+    start_result_store_sweeper()
+    return store
+
+
+# Drop the results of sessions that have ended
+def sweep_result_store():
+    if not Runtime.exists():
+        return
+    runtime = Runtime.instance()
+    store = get_result_store()
+    for session_id in store.session_ids():
+        if not runtime.is_active_session(session_id):
+            store.drop_session(session_id)
+
+def _sweep_forever():
+    while True:
+        time.sleep(STORE_SWEEP_INTERVAL_SECONDS)
+        try:
+            sweep_result_store()
+        except Exception as e:
+            print(f"Error sweeping stored results: {e}")
+
+# Start the sweeper thread once per process
+@st.cache_resource
+def start_result_store_sweeper():
+    thread = threading.Thread(target=_sweep_forever, name="result-store-sweeper", daemon=True)
+    thread.start()
+    return thread
+
+
+# Convenience wrappers for the current session
+def store_result(key, frame):
+    get_result_store().put(get_session_id(), key, frame)
+
+def load_result(key):
+    return get_result_store().get(get_session_id(), key)
+
+def drop_result(key):
+    get_result_store().drop(get_session_id(), key)
@@ -0,0 +1,152 @@
+import math
+import time
+import streamlit as st
+from db_utils import estimate_row_count, get_session_id
+from query_router import run_user_query, submit_user_query
+from scratch import get_scratch_info
+from sql_utils import break_order_ties, subquery_sql
+
+# Paginated result viewer. Only the visible window of a query's result is
+# ever fetched or sent to the browser: each page is the query wrapped in a
+# fixed order (sorted in SQL when the learner picks a column) and LIMIT /
+# OFFSET, run through the shared cached read path, and the total is the
+# planner's row estimate until the learner asks for an exact count. Viewers
+# left alone for a while expire.
+
+PAGE_SIZES = [25, 50, 100, 500]
+# Seconds without interaction after which a viewer is closed
+VIEWER_IDLE_SECONDS = 10 * 60
+
+
+def _state_key(key):
+    return f"viewer_{key}"
+
+# The query wrapped so it returns one window, in the query's own order unless
+# a sort column is given. Once the number of result columns is known, every
+# column breaks ties (in the query's own ORDER BY, or after the sort column),
+# so each run orders the rows the same way and no row repeats or goes
+# missing between pages; a query without an ORDER BY gets all its columns as
+# one. Columns are sorted by position, since result column names may repeat.
+def window_query(query, sort_position, descending, limit, offset, columns=0):
+    positions = ", ".join(str(position) for position in range(1, columns + 1))
+    inner, order = subquery_sql(query), ""
+    if sort_position is not None:
+        order = f"ORDER BY {sort_position} {'DESC' if descending else 'ASC'} NULLS LAST"
+        order += f", {positions} " if positions else " "
+    elif positions:
+        ordered = break_order_ties(query, columns)
+        if ordered is not None:
+            inner = ordered
+        else:
+            order = f"ORDER BY {positions} "
+    return f"SELECT * FROM ({inner}) AS q {order}LIMIT {limit} OFFSET {offset}"
+
+# Start viewing a read-only query's result
+def open_result_viewer(key, query):
+    scratch = get_scratch_info(get_session_id())
+    try:
+        estimate = estimate_row_count(query, search_path=scratch["schema"] if scratch else None)
+    except Exception:
+        estimate = None
+    for widget in ("page_size", "sort", "descending", "page"):
+        st.session_state.pop(f"{key}_{widget}", None)
+    st.session_state[_state_key(key)] = {
+        "query": query,
+        "estimate": estimate,
+        "exact": None,
+        "columns": None,
+        "handle": None,
+        "last_used": time.time(),
+    }
+
+def close_result_viewer(key):
+    st.session_state.pop(_state_key(key), None)
+
+def is_viewer_open(key):
+    return _state_key(key) in st.session_state
+
+# Show the current window of the viewer's result. Returns True while the
+# window is still loading, so the page knows to check back.
+def render_result_viewer(key):
+    state = st.session_state.get(_state_key(key))
+    if state is None:
+        return False
+    if time.time() - state["last_used"] > VIEWER_IDLE_SECONDS:
+        close_result_viewer(key)
+        st.info("This result has expired. Run the query again to see it.")
+        return False
+    state["last_used"] = time.time()
+
+    columns = state["columns"] or []
+    left, middle, right, last = st.columns(4)
+    page_size = left.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+    sort_position = middle.selectbox(
+        "Sort by", [None] + list(range(1, len(columns) + 1)),
+        format_func=lambda position: "(query order)" if position is None else columns[position - 1],
+        key=f"{key}_sort"
+    )
+    descending = right.selectbox(
+        "Order", ["Ascending", "Descending"], key=f"{key}_descending", disabled=sort_position is None
+    ) == "Descending"
+    # Estimates can be off, so pages are only capped once the count is exact
+    max_page = max(math.ceil(state["exact"] / page_size), 1) if state["exact"] is not None else None
+    if max_page and st.session_state.get(f"{key}_page", 1) > max_page:
+        st.session_state[f"{key}_page"] = max_page
+    page = last.number_input("Page", min_value=1, max_value=max_page, step=1, key=f"{key}_page")
+
+    offset = (page - 1) * page_size
+    query = window_query(state["query"], sort_position, descending, page_size, offset, len(columns))
+    handle = state["handle"]
+    if handle is None or handle.query != query:
+        handle = state["handle"] = submit_user_query(query)
+
+    if not handle.done():
+        st.info(f"⏳ {handle.describe_progress()}")
+        if st.button("Cancel Query", key=f"{key}_cancel"):
+            handle.cancel()
+        return True
+    if handle.status == "cancelled":
+        st.warning(f"Query cancelled after {handle.elapsed:.1f} s.")
+        return False
+    if handle.error:
+        st.error(f"Error executing query: {handle.error}")
+        return False
+
+    window = handle.result
+    if window is None or window.empty:
+        st.write("Query executed but returned no results." if page == 1 else "No rows on this page.")
+        return False
+    if state["columns"] is None:
+        # Now that the columns are known, offer them for sorting
+        state["columns"] = list(window.columns)
+        st.experimental_rerun()
+
+    st.dataframe(window)
+    if state["exact"] is not None:
+        st.caption(f"Rows {offset + 1:,}–{offset + len(window):,} of {state['exact']:,}")
+    else:
+        estimate = f"about {state['estimate']:,}" if state["estimate"] is not None else "an unknown number of"
+        st.caption(f"Rows {offset + 1:,}–{offset + len(window):,} of {estimate} rows (planner estimate)")
+        if st.button("Count Rows Exactly", key=f"{key}_count"):
+            count = run_user_query(f"SELECT COUNT(*) FROM ({subquery_sql(state['query'])}) AS q")
+            if count is not None and not count.empty:
+                state["exact"] = int(count.iloc[0, 0])
+                st.experimental_rerun()
+    return False
+
+
+# Paginate a result that is already in memory (e.g. a graded stage answer),
+# so only one page of it is sent to the browser
+def render_frame_pages(frame, key):
+    if len(frame) <= PAGE_SIZES[0]:
+        st.dataframe(frame)
+        return
+    left, right = st.columns(2)
+    page_size = left.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+    pages = math.ceil(len(frame) / page_size)
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = right.number_input("Page", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    offset = (page - 1) * page_size
+    st.dataframe(frame.iloc[offset:offset + page_size])
+    st.caption(f"Rows {offset + 1:,}–{min(offset + page_size, len(frame)):,} of {len(frame):,}")
@@ -0,0 +1,261 @@
+import difflib
+import streamlit as st
+import sqlparse
+from sqlparse import tokens as T
+from sqlparse.sql import Function, Identifier, IdentifierList, Parenthesis
+from db_utils import pooled_connection, get_session_id
+from result_cache import get_dataset_version
+from scratch import get_scratch_info
+
+# Catalog of the tables learners query, introspected from pg_catalog once per
+# dataset version (and once per write version for a session's scratch
+# schema). The schema docs, the editors' autocomplete and the pre-submit
+# validator all read it from memory instead of hand-written markdown.
+
+# Seconds a catalog is trusted even if no version bump is seen, e.g. after
+# DDL run outside the app
+CATALOG_TTL_SECONDS = 10 * 60
+
+TABLE_KINDS = {"r": "table", "p": "table", "v": "view", "m": "materialized view"}
+
+TABLES_SQL = """
+SELECT c.relname, c.relkind, c.reltuples
+FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s AND c.relkind IN ('r', 'p', 'v', 'm')
+ORDER BY c.relname
+"""
+
+COLUMNS_SQL = """
+SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s AND c.relkind IN ('r', 'p', 'v', 'm') AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY c.relname, a.attnum
+"""
+
+# Primary and foreign keys, one row per key column
+KEYS_SQL = """
+SELECT rel.relname, con.contype, a.attname, frel.relname, fa.attname
+FROM pg_constraint con
+JOIN pg_class rel ON rel.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = rel.relnamespace
+CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(attnum, fattnum)
+JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+LEFT JOIN pg_class frel ON frel.oid = con.confrelid
+LEFT JOIN pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = k.fattnum
+WHERE n.nspname = %s AND con.contype IN ('p', 'f')
+"""
+
+# Indexes on plain columns (expression columns are left out)
+INDEXES_SQL = """
+SELECT t.relname, i.relname, ix.indisprimary, ix.indisunique, array_agg(a.attname ORDER BY k.position)
+FROM pg_index ix
+JOIN pg_class i ON i.oid = ix.indexrelid
+JOIN pg_class t ON t.oid = ix.indrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+CROSS JOIN LATERAL unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, position)
+JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+WHERE n.nspname = %s
+GROUP BY t.relname, i.relname, ix.indisprimary, ix.indisunique
+ORDER BY t.relname, i.relname
+"""
+
+
+# Read a schema's tables, columns, keys, indexes and row estimates
+def introspect_schema(cur, schema):
+    tables = {}
+    cur.execute(TABLES_SQL, (schema,))
+    for name, kind, reltuples in cur.fetchall():
+        tables[name] = {
+            "kind": TABLE_KINDS[kind],
+            # reltuples is -1 until the table has been analyzed
+            "rows": int(reltuples) if reltuples >= 0 else None,
+            "columns": [],
+            "primary_key": [],
+            "foreign_keys": {},
+            "indexes": [],
+        }
+
+    cur.execute(COLUMNS_SQL, (schema,))
+    for table, column, sql_type, not_null in cur.fetchall():
+        tables[table]["columns"].append({"name": column, "type": sql_type, "nullable": not not_null})
+
+    cur.execute(KEYS_SQL, (schema,))
+    for table, kind, column, foreign_table, foreign_column in cur.fetchall():
+        if kind == "p":
+            tables[table]["primary_key"].append(column)
+        else:
+            tables[table]["foreign_keys"][column] = f"{foreign_table}.{foreign_column}"
+
+    cur.execute(INDEXES_SQL, (schema,))
+    for table, index, primary, unique, columns in cur.fetchall():
+        if table in tables:
+            tables[table]["indexes"].append(
+                {"name": index, "columns": list(columns), "primary": primary, "unique": unique}
+            )
+    return {"schema": schema, "tables": tables}
+
+
+# version is only part of the cache key: a new version means a fresh introspection
+@st.cache_data(show_spinner=False, ttl=CATALOG_TTL_SECONDS, max_entries=64)
+def load_catalog(schema, version):
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        catalog = introspect_schema(cur, schema)
+        cur.close()
+    return catalog
+
+# (schema, version) a catalog is cached under: a shared schema per dataset
+# version, or by default wherever the current session's queries run (its
+# scratch schema once it has written, the shared tables otherwise)
+def catalog_key(schema=None):
+    if schema:
+        return schema, get_dataset_version()
+    scratch = get_scratch_info(get_session_id())
+    if scratch is None:
+        return "public", get_dataset_version()
+    return scratch["schema"], f"{get_dataset_version()}@{scratch['version']}"
+
+# Catalog of a shared schema, cached per dataset version
+def get_schema_catalog(schema="public"):
+    return load_catalog(*catalog_key(schema))
+
+# Catalog of wherever the current session's queries run
+def get_session_catalog():
+    return load_catalog(*catalog_key())
+
+
+def _identifiers(token):
+    if isinstance(token, IdentifierList):
+        return [t for t in token.get_identifiers() if isinstance(t, Identifier)]
+    return [token] if isinstance(token, Identifier) else []
+
+# Collect (schema, table, alias) for every table named after FROM or JOIN,
+# and the names of CTEs, descending into subqueries. Function calls are not
+# descended into, so EXTRACT(YEAR FROM ...) isn't mistaken for a table.
+def _collect_tables(token_list, tables, ctes):
+    after_from = after_with = False
+    for token in token_list.tokens:
+        if token.is_whitespace or token.ttype in T.Comment:
+            continue
+        if token.ttype in T.Keyword.CTE:
+            after_with = True
+            continue
+        if after_with:
+            if token.ttype in T.Keyword and token.normalized == "RECURSIVE":
+                continue
+            # A CTE with a column list, r(n) AS (...), is still named r
+            for identifier in _identifiers(token):
+                ctes.add(identifier.get_real_name().lower())
+                _collect_tables(identifier, tables, ctes)
+            after_with = False
+            continue
+        if token.ttype in T.Keyword and (token.normalized == "FROM" or token.normalized.endswith("JOIN")):
+            after_from = True
+            continue
+        if after_from:
+            after_from = False
+            for identifier in _identifiers(token):
+                first = identifier.token_first(skip_ws=True, skip_cm=True)
+                if isinstance(first, Parenthesis):
+                    _collect_tables(first, tables, ctes)
+                elif not isinstance(first, Function) and identifier.get_real_name():
+                    tables.append((
+                        (identifier.get_parent_name() or "").lower() or None,
+                        identifier.get_real_name().lower(),
+                        (identifier.get_alias() or identifier.get_real_name()).lower(),
+                    ))
+            if _identifiers(token):
+                continue
+        if token.is_group and not isinstance(token, Function):
+            _collect_tables(token, tables, ctes)
+
+def _qualified_columns(token_list):
+    for token in token_list.tokens:
+        if isinstance(token, Identifier) and token.get_parent_name() and token.get_real_name():
+            yield token.get_parent_name().lower(), token.get_real_name().lower()
+        if token.is_group:
+            yield from _qualified_columns(token)
+
+def _did_you_mean(name, candidates):
+    matches = difflib.get_close_matches(name, candidates, n=1)
+    return f" Did you mean `{matches[0]}`?" if matches else ""
+
+# Problems found before a query is sent: tables that don't exist and
+# alias.column references to columns the table doesn't have. Only what the
+# catalog can tell for sure is reported; anything it can't resolve is left
+# to the database.
+def validate_query(query, catalog):
+    tables = catalog["tables"]
+    problems = []
+    for statement in sqlparse.parse(query or ""):
+        references, ctes = [], set()
+        _collect_tables(statement, references, ctes)
+
+        aliases = {}
+        for schema, table, alias in references:
+            if schema not in (None, catalog["schema"]) or table in ctes:
+                continue
+            if table not in tables:
+                problems.append(f"There is no table named `{table}`.{_did_you_mean(table, list(tables))}")
+                continue
+            # An alias used for two different tables can't be checked
+            aliases[alias] = table if aliases.get(alias, table) == table else None
+
+        for qualifier, column in _qualified_columns(statement):
+            table = aliases.get(qualifier)
+            if table is None:
+                continue
+            columns = [c["name"] for c in tables[table]["columns"]]
+            if column != "*" and column not in columns:
+                problems.append(
+                    f"`{table}` has no column named `{column}`.{_did_you_mean(column, columns)}"
+                )
+    # Each problem once, in the order found
+    return list(dict.fromkeys(problems))
+
+# validate_query for the UI: a catalog that can't be loaded never blocks a submit
+def check_query(query, schema=None):
+    try:
+        catalog = load_catalog(*catalog_key(schema))
+    except Exception:
+        return []
+    return validate_query(query, catalog)
+
+
+def _column_notes(table, column):
+    notes = []
+    if column["name"] in table["primary_key"]:
+        notes.append("primary key")
+    if column["name"] in table["foreign_keys"]:
+        notes.append(f"references `{table['foreign_keys'][column['name']]}`")
+    if not column["nullable"] and column["name"] not in table["primary_key"]:
+        notes.append("not null")
+    return f" ({', '.join(notes)})" if notes else ""
+
+def _describe_rows(table):
+    return f"about {table['rows']:,} rows" if table["rows"] is not None else "row count not yet known"
+
+# Column-by-column docs for each table in a catalog
+def render_schema_docs(catalog, icons=None):
+    for name, table in catalog["tables"].items():
+        icon = (icons or {}).get(name, "📄")
+        st.subheader(f"{icon} {name.capitalize()} Table Schema")
+        st.caption(f"{table['kind'].capitalize()} · {_describe_rows(table)}")
+        st.write("\n".join(
+            f"- `{column['name']}`: {column['type'].upper()}{_column_notes(table, column)}  "
+            for column in table["columns"]
+        ))
+
+# One line per table: size and indexes
+def render_schema_summary(catalog):
+    lines = ["| table | rows | indexes |", "|-------|------|---------|"]
+    for name, table in catalog["tables"].items():
+        indexes = ", ".join(
+            f"`{', '.join(index['columns'])}`" + (" (primary key)" if index["primary"] else "")
+            for index in table["indexes"]
+        )
+        rows = f"{table['rows']:,}" if table["rows"] is not None else "?"
+        lines.append(f"| `{name}` | {rows} | {indexes or 'none'} |")
+    st.markdown("\n".join(lines))
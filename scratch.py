@@ -0,0 +1,376 @@
+import csv
+import hashlib
+import io
+import re
+import threading
+import time
+import streamlit as st
+import pandas as pd
+from streamlit.runtime import Runtime
+from db_utils import pooled_connection, clone_galaxy_tables, run_statements, GALAXY_TABLES
+from materialize import frame_from_cursor, register_fast_types
+
+# Each session that writes gets its own schema holding unlogged copies of the
+# galaxy tables. Schemas are created lazily on the first write, and a
+# background sweeper drops them once the session has been idle for a while.
+
+SCRATCH_PREFIX = "scratch_"
+# Role scratch statements run as (see db/scratch_role.sql). It owns the scratch
+# schemas and has no privileges on the shared galaxy tables or the app's state,
+# so the database refuses whatever the statement classifier lets through.
+DEFAULT_SCRATCH_ROLE = "galaxy_scratch"
+# Seconds without a write or read after which a scratch schema is dropped
+SCRATCH_IDLE_SECONDS = 30 * 60
+# How often the sweeper runs
+SWEEP_INTERVAL_SECONDS = 60
+# Bounds that keep scratch usage predictable for a large class
+MAX_SCRATCH_SCHEMAS = 300
+MAX_SCRATCH_BYTES = 16 * 1024 * 1024  # per session
+# Largest CSV a learner may upload (keep server.maxUploadSize in
+# .streamlit/config.toml in line), and how much of it is sampled for types
+MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+UPLOAD_SAMPLE_BYTES = 64 * 1024
+# Bytes handed to COPY per read
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
+
+class ScratchLimitError(Exception):
+    pass
+
+
+# Process-wide registry: session id -> schema, write version, size and timings
+@st.cache_resource
+def get_scratch_registry():
+    return {"sessions": {}, "lock": threading.Lock()}
+
+def scratch_schema_name(session_id):
+    return SCRATCH_PREFIX + hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:12]
+
+def scratch_role():
+    return st.secrets["postgresql"].get("SCRATCH_ROLE", DEFAULT_SCRATCH_ROLE)
+
+# Run the rest of the transaction as the scratch role, inside the session's
+# schema. SET LOCAL ends with the transaction, so the pooled connection stays clean.
+def _enter_scratch(cur, schema):
+    cur.execute(f"SET LOCAL ROLE {scratch_role()}")
+    cur.execute("SET LOCAL search_path TO %s", (schema,))
+
+# Registry entry for a session, or None until its first write
+def get_scratch_info(session_id):
+    registry = get_scratch_registry()
+    with registry["lock"]:
+        info = registry["sessions"].get(session_id)
+        if info:
+            info["last_used"] = time.time()
+        return info
+
+def _schema_bytes(cur, schema):
+    cur.execute(
+        "SELECT COALESCE(SUM(pg_total_relation_size(c.oid)), 0) FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = %s",
+        (schema,)
+    )
+    return int(cur.fetchone()[0])
+
+# The last-activity time is also kept as the schema's comment, so the sweeper
+# can reap schemas left behind by other processes or a restart. Writes touch
+# it as they commit; the owning process's sweeper touches it for reads.
+def _touch_schema(cur, schema, at=None):
+    cur.execute(f"COMMENT ON SCHEMA {schema} IS '{int(at or time.time())}'")
+
+def _schema_exists(cur, schema):
+    cur.execute("SELECT 1 FROM pg_namespace WHERE nspname = %s", (schema,))
+    return cur.fetchone() is not None
+
+# Create the session's scratch schema on first use and clone the galaxy tables
+# into it. A schema that has gone (e.g. reaped by another process) is cloned
+# again, under a new version so nothing cached from the old one is served.
+def ensure_scratch_schema(conn, session_id):
+    info = get_scratch_info(session_id)
+    if info:
+        cur = conn.cursor()
+        exists = _schema_exists(cur, info["schema"])
+        cur.close()
+        if exists:
+            return info
+
+    registry = get_scratch_registry()
+    with registry["lock"]:
+        if not info and len(registry["sessions"]) >= MAX_SCRATCH_SCHEMAS:
+            raise ScratchLimitError("All scratch areas are in use right now. Please try again in a few minutes.")
+
+    schema = scratch_schema_name(session_id)
+    cur = conn.cursor()
+    start = time.perf_counter()
+    cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cur.execute(f"CREATE SCHEMA {schema} AUTHORIZATION {scratch_role()}")
+    clone_galaxy_tables(cur, schema)
+    # Cloned by the app's role, which can read the galaxy tables; handed to the scratch role
+    for table in GALAXY_TABLES:
+        cur.execute(f"ALTER TABLE {schema}.{table} OWNER TO {scratch_role()}")
+    _touch_schema(cur, schema)
+    size = _schema_bytes(cur, schema)
+    conn.commit()
+    cur.close()
+
+    info = {
+        "schema": schema,
+        "version": info["version"] + 1 if info else 0,
+        "clone_ms": (time.perf_counter() - start) * 1000,
+        "bytes": size,
+        "created_at": time.time(),
+        "last_used": time.time(),
+    }
+    with registry["lock"]:
+        registry["sessions"][session_id] = info
+    start_scratch_sweeper()
+    return info
+
+# Temporary tables outlive the transaction, and pg_temp is searched before
+# the scratch schema: drop them before the next session borrows the connection
+def _discard_temp(conn, cur):
+    if not conn.closed:
+        conn.rollback()
+        cur.execute("DISCARD TEMP")
+        conn.commit()
+    cur.close()
+
+# Run a statement inside the session's scratch schema. Writes are committed
+# unless they push the schema past MAX_SCRATCH_BYTES; reads are rolled back.
+def execute_in_scratch(query, session_id, write=True):
+    try:
+        with pooled_connection("write") as conn:
+            info = ensure_scratch_schema(conn, session_id)
+            cur = conn.cursor()
+            try:
+                register_fast_types(cur)
+                _enter_scratch(cur, info["schema"])
+                cur.execute(query)
+                if cur.description:
+                    result = frame_from_cursor(cur)
+                else:
+                    result = pd.DataFrame({"Result": [f"{cur.statusmessage} (in your scratch copy)"]})
+
+                if write:
+                    size = _schema_bytes(cur, info["schema"])
+                    if size > MAX_SCRATCH_BYTES:
+                        conn.rollback()
+                        raise ScratchLimitError(
+                            f"Your scratch area is full ({MAX_SCRATCH_BYTES // (1024 * 1024)} MB). Reset it to start over."
+                        )
+                    _touch_schema(cur, info["schema"])
+                    conn.commit()
+                    info["bytes"] = size
+                    info["version"] += 1
+                return result
+            finally:
+                _discard_temp(conn, cur)
+    except Exception as e:
+        st.error(f"Error executing query: {e}")
+        return pd.DataFrame()
+
+# Run a script in the session's scratch schema, all in one transaction: it is
+# committed as a whole or, if any statement fails, not at all
+def execute_script_in_scratch(statements, session_id):
+    with pooled_connection("write") as conn:
+        info = ensure_scratch_schema(conn, session_id)
+        cur = conn.cursor()
+        try:
+            _enter_scratch(cur, info["schema"])
+            results = run_statements(cur, statements)
+            size = _schema_bytes(cur, info["schema"])
+            if size > MAX_SCRATCH_BYTES:
+                raise ScratchLimitError(
+                    f"Your scratch area is full ({MAX_SCRATCH_BYTES // (1024 * 1024)} MB). Reset it to start over."
+                )
+            _touch_schema(cur, info["schema"])
+            conn.commit()
+            info["bytes"] = size
+            info["version"] += 1
+            return results
+        finally:
+            _discard_temp(conn, cur)
+
+# CSV uploads. Column types are inferred from a sampled prefix of the file,
+# then the whole file is streamed into a new scratch table with COPY FROM
+# STDIN, without ever loading it into pandas.
+
+# Postgres type -> pattern every non-empty sampled value must match, in order of preference
+CSV_TYPE_PATTERNS = [
+    ("bigint", re.compile(r"[+-]?\d{1,18}")),
+    ("double precision", re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")),
+    ("boolean", re.compile(r"(?i)true|false|t|f|yes|no")),
+    ("date", re.compile(r"\d{4}-\d{2}-\d{2}")),
+    ("timestamp", re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?")),
+]
+
+# Lowercase identifier made of letters, digits and underscores
+def sql_identifier(name, fallback):
+    identifier = re.sub(r"[^a-z0-9_]+", "_", name.strip().lower()).strip("_")[:63]
+    if not identifier:
+        identifier = fallback
+    if identifier[0].isdigit():
+        identifier = f"{fallback}_{identifier}"[:63]
+    return identifier
+
+def _infer_column_type(values):
+    values = [value for value in values if value != ""]
+    for sql_type, pattern in CSV_TYPE_PATTERNS:
+        if values and all(pattern.fullmatch(value) for value in values):
+            return sql_type
+    return "text"
+
+# Column names and types from the start of a CSV file with a header row
+def infer_csv_columns(sample):
+    text = sample.decode("utf-8-sig", errors="replace")
+    if len(sample) == UPLOAD_SAMPLE_BYTES and "\n" in text:
+        # The last line may be cut off
+        text = text[:text.rindex("\n")]
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        raise ValueError("The file is empty.")
+    header, body = rows[0], rows[1:]
+    names = []
+    for index, name in enumerate(header):
+        name = sql_identifier(name, f"column_{index + 1}")
+        while name in names:
+            name = f"{name}_{index + 1}"
+        names.append(name)
+    return [
+        (name, _infer_column_type([row[index] for row in body if index < len(row)]))
+        for index, name in enumerate(names)
+    ]
+
+# File wrapper that reports bytes and lines read while COPY consumes it
+class _ProgressReader:
+    def __init__(self, file, on_progress):
+        self.file = file
+        self.on_progress = on_progress
+        self.bytes = 0
+        self.lines = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.bytes += len(data)
+        self.lines += data.count(b"\n")
+        if self.on_progress:
+            self.on_progress(self.bytes, self.lines)
+        return data
+
+# Load an uploaded CSV file into a new table in the session's scratch
+# schema. on_progress(bytes read, lines read) is called as the file streams.
+def load_csv_into_scratch(file, table_name, session_id, on_progress=None):
+    file.seek(0, io.SEEK_END)
+    size = file.tell()
+    if size > MAX_UPLOAD_BYTES:
+        raise ScratchLimitError(f"Uploads are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    file.seek(0)
+    columns = infer_csv_columns(file.read(UPLOAD_SAMPLE_BYTES))
+    file.seek(0)
+
+    table = sql_identifier(table_name, "upload")
+    if table in GALAXY_TABLES:
+        raise ValueError(f"`{table}` is one of the galaxy tables. Please pick another name.")
+
+    start = time.perf_counter()
+    with pooled_connection("write") as conn:
+        info = ensure_scratch_schema(conn, session_id)
+        cur = conn.cursor()
+        _enter_scratch(cur, info["schema"])
+        # Quoted, since a sanitized name can still be a keyword like "order"
+        cur.execute(f'DROP TABLE IF EXISTS {info["schema"]}."{table}"')
+        cur.execute(
+            f'CREATE TABLE {info["schema"]}."{table}" ('
+            + ", ".join(f'"{name}" {sql_type}' for name, sql_type in columns) + ")"
+        )
+        copy_sql = f'COPY {info["schema"]}."{table}" FROM STDIN ' + "WITH (FORMAT csv, HEADER true, ENCODING 'UTF8')"
+        cur.copy_expert(copy_sql, _ProgressReader(file, on_progress), size=UPLOAD_CHUNK_BYTES)
+        rows = cur.rowcount
+        schema_size = _schema_bytes(cur, info["schema"])
+        if schema_size > MAX_SCRATCH_BYTES:
+            conn.rollback()
+            raise ScratchLimitError(
+                f"Your scratch area is full ({MAX_SCRATCH_BYTES // (1024 * 1024)} MB). Reset it to start over."
+            )
+        _touch_schema(cur, info["schema"])
+        conn.commit()
+        cur.close()
+        info["bytes"] = schema_size
+        info["version"] += 1
+    return {
+        "table": table,
+        "columns": columns,
+        "rows": rows,
+        "bytes": size,
+        "seconds": time.perf_counter() - start,
+    }
+
+# Drop a session's scratch schema, e.g. when the learner resets it
+def drop_scratch_schema(session_id):
+    registry = get_scratch_registry()
+    with registry["lock"]:
+        registry["sessions"].pop(session_id, None)
+    with pooled_connection("write") as conn:
+        cur = conn.cursor()
+        cur.execute(f"DROP SCHEMA IF EXISTS {scratch_schema_name(session_id)} CASCADE")
+        conn.commit()
+        cur.close()
+
+# Aggregate clone time and storage across all scratch schemas in this process
+def scratch_stats():
+    registry = get_scratch_registry()
+    with registry["lock"]:
+        sessions = list(registry["sessions"].values())
+    return {
+        "schemas": len(sessions),
+        "total_bytes": sum(info["bytes"] for info in sessions),
+        "avg_clone_ms": sum(info["clone_ms"] for info in sessions) / len(sessions) if sessions else 0.0,
+    }
+
+
+# Drop scratch schemas whose sessions have ended or been idle too long,
+# including ones left behind by other processes or a restart
+def sweep_scratch_schemas():
+    now = time.time()
+    runtime = Runtime.instance() if Runtime.exists() else None
+    registry = get_scratch_registry()
+    expired = set()
+    with registry["lock"]:
+        for session_id, info in list(registry["sessions"].items()):
+            ended = runtime is not None and not runtime.is_active_session(session_id)
+            if ended or now - info["last_used"] > SCRATCH_IDLE_SECONDS:
+                expired.add(info["schema"])
+                del registry["sessions"][session_id]
+        active = {info["schema"]: info["last_used"] for info in registry["sessions"].values()}
+
+    with pooled_connection("write") as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT nspname, obj_description(oid, 'pg_namespace') FROM pg_namespace WHERE nspname LIKE %s",
+            (SCRATCH_PREFIX + "%",)
+        )
+        for schema, comment in cur.fetchall():
+            last_used = float(comment) if comment and comment.isdigit() else 0
+            if schema in active:
+                # Reads don't touch the schema themselves; keep other processes' sweepers off it
+                if active[schema] > last_used:
+                    _touch_schema(cur, schema, active[schema])
+            elif schema in expired or now - last_used > SCRATCH_IDLE_SECONDS:
+                cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.commit()
+        cur.close()
+
+def _sweep_forever():
+    while True:
+        time.sleep(SWEEP_INTERVAL_SECONDS)
+        try:
+            sweep_scratch_schemas()
+        except Exception as e:
+            print(f"Error sweeping scratch schemas: {e}")
+
+# Start the sweeper thread once per process
+@st.cache_resource
+def start_scratch_sweeper():
+    thread = threading.Thread(target=_sweep_forever, name="scratch-sweeper", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,176 @@
+import re
+import hashlib
+import sqlparse
+from sqlparse import tokens as T
+
+# Function to sanitize SQL input
+def sanitize_sql_input(sql_input):
+    # Remove SQL comments
+    sql_input = re.sub(r'--.*', '', sql_input)
+    sql_input = re.sub(r'/\*.*?\*/', '', sql_input, flags=re.DOTALL)
+    # Strip leading/trailing whitespace
+    return sql_input.strip()
+
+# Function to normalize and format SQL query
+def normalize_sql(query):
+    return sqlparse.format(query, reindent=True, keyword_case='upper').strip()
+
+# Canonical single-line form of a query: comments and whitespace dropped,
+# keywords, operators and unquoted names lowercased. With keep_literals=False every
+# string/number literal becomes '?', so queries that only differ in their
+# constants share one canonical form.
+def canonicalize_sql(query, keep_literals=True):
+    parts = []
+    for statement in sqlparse.parse(query or ""):
+        for token in statement.flatten():
+            if token.is_whitespace or token.ttype in T.Comment:
+                continue
+            if token.ttype in T.Literal and token.ttype not in T.String.Symbol:
+                parts.append(token.value if keep_literals else "?")
+            elif token.ttype in T.Keyword or token.ttype in T.Name or token.ttype in T.Operator:
+                parts.append(token.value.lower())
+            else:
+                parts.append(token.value)
+    canonical = " ".join(parts).replace(" . ", ".")
+    return canonical.rstrip("; ")
+
+# A single statement made fit to wrap as a subquery, "(...)": comments and
+# trailing semicolons are removed, since a trailing "-- comment" would swallow
+# the closing parenthesis
+def subquery_sql(query):
+    return sqlparse.format(query or "", strip_comments=True).strip().rstrip("; \t\r\n")
+
+# The query with its top-level ORDER BY extended by every output column
+# (by position, 1 to columns), so rows it leaves tied come back in one fixed
+# order every time it runs; None if the query has no ORDER BY of its own
+def break_order_ties(query, columns):
+    tokens = sqlparse.parse(subquery_sql(query))[0].tokens if query else []
+    start = next((
+        index for index, token in enumerate(tokens)
+        if token.ttype in T.Keyword and token.normalized == "ORDER BY"
+    ), None)
+    if start is None:
+        return None
+    # The sort list runs until LIMIT, OFFSET, FETCH or a locking clause
+    end = next((
+        index for index in range(start + 1, len(tokens))
+        if tokens[index].ttype in T.Keyword and tokens[index].normalized in ("LIMIT", "OFFSET", "FETCH", "FOR")
+    ), len(tokens))
+    order = "".join(token.value for token in tokens[:end]).rstrip()
+    rest = "".join(token.value for token in tokens[end:])
+    positions = "".join(f", {position}" for position in range(1, columns + 1))
+    return f"{order}{positions} {rest}".rstrip()
+
+# Short, stable hash of the canonical form, used as a cache key
+def fingerprint_sql(query, keep_literals=True):
+    canonical = canonicalize_sql(query, keep_literals=keep_literals)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+# True for a single SELECT/WITH statement that can't change any data
+def is_read_only_query(query):
+    statements = [s for s in sqlparse.parse(query or "") if s.value.strip(" ;\n\t")]
+    if len(statements) != 1 or statements[0].get_type() != "SELECT":
+        return False
+    canonical = canonicalize_sql(query, keep_literals=False)
+    return not re.search(r"\b(into|insert|update|delete|merge|nextval|setval)\b|\bfor (share|no key|key)\b", canonical)
+
+# Routes for user SQL
+READ, WRITE, REJECTED = "read", "write", "rejected"
+
+# Statement types that change data or tables; they only ever run in scratch
+WRITE_TYPES = {"INSERT", "UPDATE", "DELETE", "CREATE", "CREATE OR REPLACE", "ALTER", "DROP", "MERGE"}
+
+# Objects users may create, alter or drop in their scratch area
+SCRATCH_OBJECTS = re.compile(r"^(create|alter|drop) (or replace )?(temp |temporary |unlogged )?(table|view|index|unique index)\b")
+
+# Functions that reach outside the query (sleeping, files, other backends, settings)
+DANGEROUS_FUNCTIONS = re.compile(
+    r"\b(pg_sleep\w*|pg_terminate_backend|pg_cancel_backend|pg_read_\w+|pg_ls_\w+|pg_stat_file"
+    r"|lo_import|lo_export|dblink\w*|set_config|pg_reload_conf|pg_advisory\w*|pg_notify"
+    r"|pg_logical_\w+|pg_promote|pg_rotate_logfile|pg_switch_wal)\s*\("
+)
+
+# Schemas a qualifier always counts as, even where the same name is also used
+# unqualified: the shared galaxy tables, the app's state (state_backend.STATE_SCHEMA),
+# scratch copies (scratch.SCRATCH_PREFIX) and the system catalogs
+KNOWN_SCHEMAS = re.compile(r"(public|galaxy_scaled|app_state|information_schema|pg_\w*|scratch_\w*)")
+# Schemas only their owner may read: the app's state and other sessions' scratch copies
+PRIVATE_SCHEMAS = re.compile(r"(app_state|scratch_\w*)")
+
+def _is_name(token):
+    return token.ttype in T.Name or token.ttype in T.String.Symbol or token.ttype in T.Keyword
+
+# Name as Postgres resolves it: quoted names keep their case, others are lowercased
+def _identifier_value(token):
+    if token.ttype in T.String.Symbol:
+        return token.value[1:-1].replace('""', '"')
+    return token.value.lower()
+
+# Schemas a statement names, with quotes stripped, so "public".planets counts
+# as public. A qualifier (the part before a dot) is a schema unless the same
+# name is also used unqualified, as a table, alias or CTE, and isn't a known schema.
+def schema_qualifiers(statement):
+    tokens = [t for t in statement.flatten() if not t.is_whitespace and t.ttype not in T.Comment]
+    qualifiers, plain = set(), set()
+    for index, token in enumerate(tokens):
+        if not _is_name(token):
+            continue
+        qualified = index + 1 < len(tokens) and tokens[index + 1].match(T.Punctuation, ".")
+        (qualifiers if qualified else plain).add(_identifier_value(token))
+    return {name for name in qualifiers if name not in plain or KNOWN_SCHEMAS.fullmatch(name)}
+
+# Classify a user statement as READ, WRITE or REJECTED, with the reason for rejections.
+# Pure SELECT/WITH statements take the read-only path; DML and table DDL go to
+# scratch; anything else is refused before it reaches the database. own_schema
+# is the session's scratch schema, the only one a statement may name freely.
+def classify_statement(query, own_schema=None):
+    statements = [s for s in sqlparse.parse(query or "") if s.value.strip(" ;\n\t")]
+    if not statements:
+        return REJECTED, "The query is empty."
+    if len(statements) > 1:
+        return REJECTED, "Run one statement at a time."
+
+    canonical = canonicalize_sql(query, keep_literals=False)
+    if DANGEROUS_FUNCTIONS.search(canonical):
+        return REJECTED, "This function isn't available in SQL Galaxy."
+    schemas = schema_qualifiers(statements[0]) - {own_schema}
+    if is_read_only_query(query):
+        if any(PRIVATE_SCHEMAS.fullmatch(schema) for schema in schemas):
+            return REJECTED, "Only the galaxy tables and your own scratch copy can be queried."
+        return READ, None
+
+    statement_type = statements[0].get_type()
+    if statement_type not in WRITE_TYPES and not canonical.startswith("truncate "):
+        return REJECTED, "Only SELECT, WITH, INSERT, UPDATE, DELETE, TRUNCATE and table DDL are allowed."
+    if statement_type in ("CREATE", "CREATE OR REPLACE", "ALTER", "DROP") and not SCRATCH_OBJECTS.match(canonical):
+        return REJECTED, "Only tables, views and indexes can be created, altered or dropped."
+    if schemas:
+        return REJECTED, "Changes can only be made to your own copy of the tables. Drop the schema prefix."
+    return WRITE, None
+
+# Most statements a sandbox script may contain
+MAX_SCRIPT_STATEMENTS = 20
+
+# Split a script into its statements. The splitter is literal-aware:
+# semicolons inside strings, quoted identifiers, dollar quotes and comments
+# don't end a statement. Comment-only pieces are dropped.
+def split_sql_script(script):
+    return [
+        statement.strip() for statement in sqlparse.split(script or "")
+        if sanitize_sql_input(statement).strip(" ;\n\t")
+    ]
+
+# Classify a whole script: REJECTED if any statement is, WRITE if any
+# statement writes, otherwise READ
+def classify_script(statements, own_schema=None):
+    if not statements:
+        return REJECTED, "The script is empty."
+    if len(statements) > MAX_SCRIPT_STATEMENTS:
+        return REJECTED, f"Scripts are limited to {MAX_SCRIPT_STATEMENTS} statements."
+    kinds = []
+    for index, statement in enumerate(statements):
+        kind, reason = classify_statement(statement, own_schema)
+        if kind == REJECTED:
+            return REJECTED, f"Statement {index + 1}: {reason}"
+        kinds.append(kind)
+    return (WRITE if WRITE in kinds else READ), None
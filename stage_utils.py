@@ -0,0 +1,268 @@
+import streamlit as st
+import pandas as pd
+import time
+from streamlit_ace import st_ace
+from db_utils import profile_sql_query, describe_plan, get_worker_pool, get_session_id, admitted
+from query_router import run_user_query
+from query_workers import QueryTimeout
+from result_store import store_result, load_result
+from result_viewer import render_frame_pages
+from schema_catalog import check_query
+from completion import render_suggestions
+from progress_store import get_progress_store, learner_id
+from leaderboard import get_leaderboard
+from analytics import record_event
+from verdict_memo import get_verdict_memo, verdict_key
+from classroom import get_classroom
+from grading import TIMEOUT_FACTOR, results_match, judge_budget, timeout_feedback
+from sql_utils import sanitize_sql_input, classify_statement, READ
+from scratch import get_scratch_info, scratch_schema_name
+
+# Shared stage rendering for the level pages. Each page renders a level dict
+# from levels.py, graded by the grader its "grading" names (see GRADERS).
+# Graders return {"correct", "result", "feedback"} and "cacheable": False when
+# the verdict may differ for the same query (errors, timing); other verdicts
+# are remembered for every session (see verdict_memo.py).
+
+
+# Initialize session state shared by every level
+def init_session_state():
+    if 'user_name' not in st.session_state:
+        st.session_state.user_name = ""
+    if 'classroom' not in st.session_state:
+        st.session_state.classroom = None  # (room code, learner) once joined
+
+# The current learner's progress through a level, kept in session state under
+# a key namespaced by level. It is loaded from the progress store on the
+# level's first view after the learner enters their name, so it survives
+# reloads and restarts.
+def level_progress(level):
+    key = f"{level['key']}_progress"
+    learner = learner_id(st.session_state.user_name)
+    progress = st.session_state.get(key)
+    if progress is None or progress["learner"] != learner:
+        stored = get_progress_store().load(learner, level["key"]) if learner else None
+        progress = stored or {
+            "answers": [False] * len(level["stages"]),
+            "current_stage": 0,  # Start at Stage 0
+            "stages_completed": 0,  # Track the stages completed
+        }
+        progress["learner"] = learner
+        st.session_state[key] = progress
+    return progress
+
+# Persist progress in the background
+def save_progress(level, progress):
+    if progress["learner"]:
+        get_progress_store().save(progress["learner"], level["key"], progress)
+
+# Who analytics events are about: the learner, or the session until they enter a name
+def event_learner():
+    return learner_id(st.session_state.user_name) or f"session:{get_session_id()}"
+
+# Record a learning-analytics event for a stage; buffered, so it costs no I/O
+def record_stage_event(event_type, level, i, **fields):
+    record_event(event_type, level=level["key"], stage=i + 1, learner=event_learner(), **fields)
+
+def update_progress(stages_completed):
+    # Ensure the progress is capped at 100%
+    progress_value = min(stages_completed / 5, 1.0)  # This ensures the progress does not exceed 1.0
+    st.progress(progress_value)  # Update the progress bar
+
+
+# Default grader: run the query for display and accept it if its normalized
+# text matches one of the stage's correct answers. The text comparison runs in
+# a worker process too, since parsing a huge paste is CPU-bound.
+def grade_by_answer(level, i, user_answer):
+    # Display the query results regardless of correctness
+    cacheable = True
+    try:
+        query_result = run_user_query(user_answer)
+        if query_result is not None and not query_result.empty:
+            result = query_result
+        else:
+            result = pd.DataFrame({"Result": ["No results returned"]})
+            # run_user_query reports failures itself and returns a frame
+            # without columns; only a real empty result may be remembered
+            cacheable = query_result is not None and len(query_result.columns) > 0
+    except Exception as e:
+        st.error(f"Error executing query: {e}")
+        result = pd.DataFrame({"Error": [str(e)]})
+        cacheable = False
+
+    try:
+        # Workers are one per admission slot: take a slot like any statement
+        with admitted():
+            correct = get_worker_pool().grade(user_answer, level["correct_answers"][i])
+    except Exception as e:
+        st.error(f"Error checking answer: {e}")
+        correct = False
+        cacheable = False
+
+    return {
+        "correct": correct,
+        "result": result,
+        "feedback": [],
+        "cacheable": cacheable,
+    }
+
+
+# Reference results only change with the dataset, so compute them once
+@st.cache_data(show_spinner=False)
+def get_reference_result(search_path, query):
+    result, _, _ = profile_sql_query(query, search_path=search_path)
+    return result
+
+# Performance grader: the result must match the stage's reference query and
+# the query must finish within the stage's time budget
+def grade_by_result_and_budget(level, i, user_answer):
+    budget_ms = level["budgets_ms"][i]
+    kind, reason = classify_statement(user_answer)
+    if kind != READ:
+        return {"correct": False, "result": None, "feedback": [reason or "Only SELECT queries can be graded here."]}
+    try:
+        result, elapsed_ms, plan = profile_sql_query(
+            user_answer,
+            search_path=level["search_path"],
+            timeout_ms=budget_ms * TIMEOUT_FACTOR
+        )
+    except QueryTimeout:
+        return {
+            "correct": False,
+            "result": None,
+            "feedback": [timeout_feedback(budget_ms)],
+            "cacheable": False,
+        }
+    except Exception as e:
+        return {"correct": False, "result": pd.DataFrame({"Error": [str(e)]}), "feedback": [], "cacheable": False}
+
+    expected = get_reference_result(level["search_path"], level["reference_queries"][i])
+    rows_match = results_match(result, expected)
+    correct, advice = judge_budget(rows_match, elapsed_ms, budget_ms)
+
+    feedback = [
+        f"⏱️ {elapsed_ms:.1f} ms (budget {budget_ms} ms) · plan cost {plan['Total Cost']:.0f}",
+        f"🗺️ Plan: {describe_plan(plan)}",
+    ] + advice
+    # Only wrong rows are a verdict on the query itself; timing varies run to run
+    return {"correct": correct, "result": result, "feedback": feedback, "cacheable": not rows_match}
+
+# Grader for each kind of level grading
+GRADERS = {"answer": grade_by_answer, "result_and_budget": grade_by_result_and_budget}
+
+# Only reads of the shared tables get the same verdict in every session:
+# statements that write change the session's scratch copy, and a session with
+# a scratch copy reads its own version of the tables
+def memoizable(user_answer):
+    session_id = get_session_id()
+    kind, _ = classify_statement(user_answer, scratch_schema_name(session_id))
+    return kind == READ and get_scratch_info(session_id) is None
+
+
+def render_stage(level, i):
+    last_stage = len(level["stages"]) - 1
+    # A learner's first view of the stage in this session starts its time-to-solve
+    viewed = st.session_state.setdefault("analytics_viewed", set())
+    if (level["key"], i, event_learner()) not in viewed:
+        viewed.add((level["key"], i, event_learner()))
+        record_stage_event("stage_view", level, i)
+
+    st.markdown(f"<div class='title'>Stage {i+1}: {level['stages'][i]} 🌌</div>", unsafe_allow_html=True)
+    st.write(level["questions"][i])
+
+    # Input with SQL code editor
+    user_answer = st_ace(
+        placeholder=f"Write your SQL query for Stage {i+1} here...",
+        language="sql",
+        theme="cobalt",
+        key=f"ace_editor_{i}",
+        auto_update=True
+    )
+    render_suggestions(user_answer, level.get("search_path"))
+
+    # Results live in the per-session result store, namespaced by level
+    result_key = f"{level['key']}_result_{i}"
+
+    # Hints
+    with st.expander("Need a hint?"):
+        if st.button("Show Hint 1", key=f"hint1_{i}"):
+            record_stage_event("hint", level, i, hint=1)
+            st.write(level["hints"][i][0])
+        if st.button("Show Hint 2", key=f"hint2_{i}"):
+            record_stage_event("hint", level, i, hint=2)
+            st.write(level["hints"][i][1])
+
+    # Button to submit answer
+    if st.button(f"Submit Answer for Stage {i+1}", key=f"submit_journey_{i}"):
+        # Mistakes the cached schema catalog can spot are reported without a database round trip
+        problems = check_query(user_answer or "", level.get("search_path"))
+        if sanitize_sql_input(user_answer).strip().strip(';').strip() == '':
+            st.write("Please enter your SQL query.")
+        elif problems:
+            for problem in problems:
+                st.error(problem)
+        else:
+            # Repeats of a query already graded for this stage, or being graded
+            # for someone else right now, are answered without grading again
+            grader = GRADERS[level.get("grading", "answer")]
+            if memoizable(user_answer):
+                verdict = get_verdict_memo().resolve(
+                    verdict_key(level, i, user_answer), user_answer, lambda: grader(level, i, user_answer)
+                )
+            else:
+                verdict = grader(level, i, user_answer)
+            if verdict["result"] is not None:
+                store_result(result_key, verdict["result"])
+            for message in verdict["feedback"]:
+                st.info(message)
+            record_stage_event("attempt", level, i, correct=bool(verdict["correct"]), sql=user_answer)
+
+            # Update progress and the leaderboard aggregates
+            progress = level_progress(level)
+            already_solved = progress["answers"][i]
+            solved = verdict["correct"] and not already_solved
+            if solved:
+                progress["answers"][i] = True
+                progress["stages_completed"] += 1
+                save_progress(level, progress)
+            # Attempts only count towards the boards until the stage is solved
+            if progress["learner"] and not already_solved:
+                get_leaderboard().record_attempt(
+                    progress["learner"], st.session_state.user_name.strip(), level["key"],
+                    solved=solved, completed=solved and all(progress["answers"])
+                )
+            classroom = st.session_state.get("classroom")
+            if classroom:
+                code, learner = classroom
+                get_classroom().record_attempt(code, learner, level["key"], i + 1, verdict["correct"])
+
+            # Check correctness and provide feedback
+            if verdict["correct"]:
+
+                # Congratulate the user
+                st.success(level["success_message"].format(name=st.session_state.user_name, stage=i+1))
+
+                # Automatic transition to the next stage
+                if i < last_stage:
+                    time.sleep(3)
+                    progress["current_stage"] = max(progress["current_stage"], i + 1)
+                    save_progress(level, progress)
+                    st.experimental_rerun()
+                else:
+                    st.balloons()
+                    st.write(level["final_message"].format(name=st.session_state.user_name))
+                    # Update progress to 100% on the final stage
+                    st.progress(1.0)
+            else:
+                st.error("Incorrect answer. Try again.")
+
+    # Display "Your Query Results" (User's query output)
+    query_result = load_result(result_key)
+    if query_result is not None:
+        st.markdown("### Your Query Results:")
+        render_frame_pages(query_result, result_key)
+
+    # Display the expected output for this stage
+    if "expected_output" in level:
+        st.markdown("### Expected Output:")
+        st.dataframe(level["expected_output"](i))
@@ -0,0 +1,248 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+import psycopg2
+import streamlit as st
+
+# Where state that outlives a session lives: learner progress, leaderboard
+# aggregates and the signals that invalidate every process's caches. It is a
+# SQLite file (local, or on a disk shared by every replica) or a Postgres
+# schema, so several app processes behind a load balancer see the same state
+# without sticky sessions. Chosen with the optional [state] secrets:
+#   BACKEND      "sqlite" (default) or "postgres"
+#   SQLITE_PATH  file for the sqlite backend
+#   DB_URL       database for the postgres backend, defaults to [postgresql] DB_URL
+#
+# SQL for the backends is written for SQLite with ? placeholders; {least}
+# and {real} stand for the dialect's LEAST function and float type.
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "state.sqlite3")
+# Postgres schema holding the state tables
+STATE_SCHEMA = "app_state"
+
+# Seconds between flushes of a write-behind queue
+FLUSH_INTERVAL_SECONDS = 2
+# Pending keys that trigger an early flush
+FLUSH_BATCH_ROWS = 200
+# Seconds a process trusts its copy of a signal before reading it again
+SIGNAL_POLL_SECONDS = 2
+
+
+class SQLiteBackend:
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+
+    def connect(self):
+        # Writers in other processes hold the file lock briefly; wait for them
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def sql(self, statement):
+        return statement.replace("{least}", "MIN").replace("{real}", "REAL")
+
+
+class PostgresBackend:
+    def __init__(self, dsn, schema=STATE_SCHEMA):
+        self.dsn = dsn
+        self.schema = schema
+
+    def connect(self):
+        conn = psycopg2.connect(self.dsn, options=f"-c search_path={self.schema}")
+        with conn, conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {self.schema}")
+        return conn
+
+    def sql(self, statement):
+        return statement.replace("?", "%s").replace("{least}", "LEAST").replace("{real}", "DOUBLE PRECISION")
+
+
+# The process's backend, from the [state] secrets
+@st.cache_resource
+def get_state_backend():
+    config = st.secrets.get("state", {})
+    if config.get("BACKEND", "sqlite") == "postgres":
+        return PostgresBackend(config.get("DB_URL") or st.secrets["postgresql"]["DB_URL"])
+    return SQLiteBackend(config.get("SQLITE_PATH", DEFAULT_STATE_PATH))
+
+
+# One backend connection used under a lock, reopened after errors (e.g. the
+# database restarting). Subclasses set SCHEMA, statements run once on connect.
+class BackendClient:
+    SCHEMA = []
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._conn = None
+        self._db_lock = threading.Lock()
+
+    # Call with the database lock held
+    def _connection(self):
+        if self._conn is None:
+            conn = self.backend.connect()
+            with conn:
+                cur = conn.cursor()
+                for statement in self.SCHEMA:
+                    cur.execute(self.backend.sql(statement))
+                cur.close()
+            self._conn = conn
+        return self._conn
+
+    def _discard_connection(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    # Run statements in one transaction; fn(cursor, sql) returns the result
+    def _transaction(self, fn):
+        with self._db_lock:
+            try:
+                conn = self._connection()
+                with conn:
+                    cur = conn.cursor()
+                    try:
+                        return fn(cur, self.backend.sql)
+                    finally:
+                        cur.close()
+            except (sqlite3.OperationalError, psycopg2.OperationalError, psycopg2.InterfaceError):
+                self._discard_connection()
+                raise
+
+    def _read(self, statement, params=()):
+        def read(cur, sql):
+            cur.execute(sql(statement), params)
+            return cur.fetchall()
+        return self._transaction(read)
+
+
+# Base for stores that write behind: queued values for the same key are
+# merged while they wait, and a background thread writes each batch in one
+# transaction, every flush_interval seconds or once batch_rows keys are
+# pending. Subclasses set SCHEMA and implement _write(cur, sql, batch).
+class WriteBehindStore(BackendClient):
+    def __init__(self, backend, flush_interval=FLUSH_INTERVAL_SECONDS, batch_rows=FLUSH_BATCH_ROWS):
+        super().__init__(backend)
+        self.flush_interval = flush_interval
+        self.batch_rows = batch_rows
+        self.queued = 0
+        self.writes = 0
+        self.flushes = 0
+        # Create the tables up front, so a misconfigured backend fails loudly
+        self._transaction(lambda cur, sql: None)
+        # key -> merged value, waiting to be written
+        self._pending = {}
+        self._lock = threading.Condition()
+        # Held for a whole flush, so flush() returns only once nothing taken
+        # from the queue before it is still on its way to the backend
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._flush_forever, name=f"{type(self).__name__}-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.flush)
+
+    # How a newer value combines with one already waiting; the newest wins by default
+    def _merge(self, pending, value):
+        return value
+
+    def _write(self, cur, sql, batch):
+        raise NotImplementedError
+
+    # Queue a value; returns at once
+    def _queue(self, key, value):
+        with self._lock:
+            self.queued += 1
+            self._pending[key] = self._merge(self._pending[key], value) if key in self._pending else value
+            if len(self._pending) >= self.batch_rows:
+                self._lock.notify()
+
+    # Write everything pending in one transaction
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                self._transaction(lambda cur, sql: self._write(cur, sql, batch))
+            except Exception:
+                # Put the batch back, merged with anything queued meanwhile
+                with self._lock:
+                    for key, value in batch.items():
+                        self._pending[key] = self._merge(value, self._pending[key]) if key in self._pending else value
+                raise
+            with self._lock:
+                self.writes += len(batch)
+                self.flushes += 1
+
+    def _flush_forever(self):
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: len(self._pending) >= self.batch_rows, timeout=self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing {type(self).__name__}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {"queued": self.queued, "writes": self.writes, "flushes": self.flushes, "pending": len(self._pending)}
+
+
+# Named counters every process watches, e.g. the dataset version: bumping
+# one in any process invalidates the caches keyed by it in all of them,
+# within SIGNAL_POLL_SECONDS
+class StateSignals(BackendClient):
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS state_signals (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """,
+    ]
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        # name -> (read at, version)
+        self._seen = {}
+        self._seen_lock = threading.Lock()
+
+    def get(self, name):
+        with self._seen_lock:
+            seen = self._seen.get(name)
+            if seen is not None and time.monotonic() - seen[0] < SIGNAL_POLL_SECONDS:
+                return seen[1]
+        try:
+            rows = self._read("SELECT version FROM state_signals WHERE name = ?", (name,))
+            version = rows[0][0] if rows else 0
+        except Exception as e:
+            # Keep serving the last known version while the backend is away
+            print(f"Error reading signal {name}: {e}")
+            version = seen[1] if seen is not None else 0
+        with self._seen_lock:
+            self._seen[name] = (time.monotonic(), version)
+        return version
+
+    def bump(self, name):
+        def bump(cur, sql):
+            cur.execute(sql(
+                "INSERT INTO state_signals (name, version) VALUES (?, 1) "
+                "ON CONFLICT (name) DO UPDATE SET version = state_signals.version + 1"
+            ), (name,))
+            cur.execute(sql("SELECT version FROM state_signals WHERE name = ?"), (name,))
+            return cur.fetchone()[0]
+        version = self._transaction(bump)
+        with self._seen_lock:
+            self._seen[name] = (time.monotonic(), version)
+        return version
+
+
+@st.cache_resource
+def get_state_signals():
+    return StateSignals(get_state_backend())
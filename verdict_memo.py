@@ -0,0 +1,141 @@
+import threading
+from collections import OrderedDict
+import streamlit as st
+from sql_utils import fingerprint_sql
+from grading import answer_fingerprint
+from result_cache import get_dataset_version
+
+# Verdicts for stage submissions, shared by every session in the process.
+# Many learners submit the very same query for a stage, so a verdict is
+# remembered under (level, stage, canonical fingerprint, answer fingerprint,
+# dataset version) with its result frame and feedback, and repeats are answered without
+# running the query or grading it again. Graders mark verdicts that don't
+# only depend on the query (errors, timing) as not cacheable. Identical
+# submissions that arrive while the first is still being graded wait for
+# its verdict instead of running too, so in a busy classroom the database
+# sees each distinct query once per process.
+
+# Verdicts remembered at most
+MAX_VERDICTS = 5000
+# Upper bound on the memory held by remembered result frames, in bytes
+MAX_VERDICT_BYTES = 32 * 1024 * 1024
+# Results bigger than this share of the budget are not remembered
+MAX_ENTRY_SHARE = 0.125
+# Characters of the first submission kept as an example for instructors
+MAX_EXAMPLE_CHARS = 2000
+
+
+class VerdictMemo:
+    def __init__(self, max_verdicts=MAX_VERDICTS, max_bytes=MAX_VERDICT_BYTES):
+        self.max_verdicts = max_verdicts
+        self.max_bytes = max_bytes
+        # key -> {"verdict", "size", "hits", "example"}
+        self._entries = OrderedDict()
+        # key -> {"done": Event, "verdict"} for verdicts being graded
+        self._grading = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    # Remembered verdicts and their frames are shared and must not be mutated
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry["hits"] += 1
+            self.hits += 1
+            return entry["verdict"]
+
+    # The verdict for key: remembered, shared with an identical submission
+    # being graded, or from grade() otherwise
+    def resolve(self, key, example, grade):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry["hits"] += 1
+                self.hits += 1
+                return entry["verdict"]
+            grading = self._grading.get(key)
+            if grading is None:
+                self.misses += 1
+                grading = self._grading[key] = {"done": threading.Event(), "verdict": None}
+                first = True
+            else:
+                self.shared += 1
+                first = False
+        if not first:
+            grading["done"].wait()
+            # Grade it ourselves if the first submission failed or got a
+            # verdict that only held for it
+            verdict = grading["verdict"]
+            return verdict if verdict and verdict.get("cacheable", True) else grade()
+        try:
+            verdict = grading["verdict"] = grade()
+            if verdict.get("cacheable", True):
+                self.put(key, verdict, example)
+            return verdict
+        finally:
+            with self._lock:
+                del self._grading[key]
+            grading["done"].set()
+
+    def put(self, key, verdict, example):
+        result = verdict["result"]
+        size = int(result.memory_usage(index=True, deep=True).sum()) if result is not None else 0
+        if size > self.max_bytes * MAX_ENTRY_SHARE:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                "verdict": verdict, "size": size, "hits": 0, "example": example[:MAX_EXAMPLE_CHARS]
+            }
+            self.bytes += size
+            # Forget least recently used verdicts until we're back under both limits
+            while len(self._entries) > self.max_verdicts or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        self.bytes -= self._entries.pop(key)["size"]
+
+    # Remembered wrong verdicts answered most often: (level, stage, fingerprint, hits, example)
+    def top_wrong(self, limit=10):
+        with self._lock:
+            wrong = [
+                (level, stage + 1, fingerprint, entry["hits"], entry["example"])
+                for (level, stage, fingerprint, *_), entry in self._entries.items()
+                if not entry["verdict"]["correct"]
+            ]
+        return sorted(wrong, key=lambda row: row[3], reverse=True)[:limit]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "shared": self.shared,
+            }
+
+
+# One memo per server process, shared by every session
+@st.cache_resource
+def get_verdict_memo():
+    return VerdictMemo()
+
+
+# Levels graded on the answer's text also key on its normalized text, which
+# tells apart queries the canonical fingerprint doesn't (and vice versa:
+# lowercasing merges literals that give different results)
+def verdict_key(level, i, query):
+    answer = answer_fingerprint(query) if level.get("grading", "answer") == "answer" else None
+    return (level["key"], i, fingerprint_sql(query), answer, get_dataset_version())